@@ -0,0 +1,127 @@
+# /benchmarks/bench_completion.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - tab completion latency benchmark
+"""Check that tab completion stays within its latency budget.
+
+This runs the bash completion function in completion/showmehow, which
+is what users hit on every TAB, in a fresh bash each time, against a
+warm cache where the flatpak keeps it in a scratch home directory. It
+also runs showmehow-complete, which bash falls back to once the cache
+is stale, in a fresh interpreter each time. It exits with a non-zero
+status if the median latency of either is over budget.
+
+Usage: python benchmarks/bench_completion.py [--runs N] [--budget SECONDS]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Where the flatpak keeps the cache, relative to the home directory
+FLATPAK_CACHE_HOME = os.path.join(".var", "app", "com.endlessm.Showmehow", "cache")
+
+# Complete the first argument of showmehow, as bash does on TAB
+COMPLETE_SCRIPT = """
+source "$1"
+COMP_WORDS=(showmehow "")
+COMP_CWORD=1
+_showmehow
+echo "${COMPREPLY[@]}"
+"""
+
+# A keypress should not be able to feel sluggish. Most of this is the
+# startup time of the interpreter itself.
+BUDGET_SECONDS = 0.1
+
+NAMES = ["info", "fortune", "readfile", "breakit", "changesetting",
+         "navigation", "text", "ps", "python"]
+
+
+def _percentile(samples, fraction):
+    """Get the sample at fraction of the way through sorted samples."""
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser("Tab completion latency benchmark")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--budget", type=float, default=BUDGET_SECONDS)
+    arguments = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="showmehow-bench-")
+    try:
+        env = dict(os.environ,
+                   HOME=scratch,
+                   XDG_CACHE_HOME=os.path.join(scratch, FLATPAK_CACHE_HOME),
+                   XDG_CONFIG_HOME=os.path.join(scratch, "config"),
+                   PYTHONPATH=ROOT)
+        os.environ.update(env)
+
+        sys.path.insert(0, ROOT)
+        from showmehow.completion import (read_unlocked_names,
+                                          write_unlocked_names)
+
+        write_unlocked_names(NAMES)
+
+        start = time.time()
+        for _ in range(arguments.runs):
+            assert read_unlocked_names() == NAMES
+        in_process = (time.time() - start) / arguments.runs
+
+        samples = []
+        for _ in range(arguments.runs):
+            start = time.time()
+            output = subprocess.check_output([sys.executable,
+                                              "-m",
+                                              "showmehow.completion"],
+                                             env=env)
+            samples.append(time.time() - start)
+            assert output.decode("utf-8").split() == NAMES
+
+        # The host does not have XDG_CACHE_HOME pointing into the flatpak
+        bash_env = dict(env)
+        del bash_env["XDG_CACHE_HOME"]
+        bash_samples = []
+        for _ in range(arguments.runs):
+            start = time.time()
+            output = subprocess.check_output([
+                "bash",
+                "-c",
+                COMPLETE_SCRIPT,
+                "bench_completion",
+                os.path.join(ROOT, "completion", "showmehow")
+            ], env=bash_env)
+            bash_samples.append(time.time() - start)
+            assert output.decode("utf-8").split() == NAMES
+    finally:
+        shutil.rmtree(scratch)
+
+    median = _percentile(samples, 0.5)
+    bash_median = _percentile(bash_samples, 0.5)
+    print("cache read:      {:8.3f} ms".format(in_process * 1000))
+    print("bash TAB p50:    {:8.3f} ms".format(bash_median * 1000))
+    print("bash TAB p95:    {:8.3f} ms".format(_percentile(bash_samples, 0.95) * 1000))
+    print("completion p50:  {:8.3f} ms".format(median * 1000))
+    print("completion p95:  {:8.3f} ms".format(_percentile(samples, 0.95) * 1000))
+    print("budget:          {:8.3f} ms".format(arguments.budget * 1000))
+
+    if max(median, bash_median) > arguments.budget:
+        print("FAIL: completion is over budget")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+# /benchmarks/bench_replay.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - end to end transcript replay benchmark
+"""Replay recorded transcripts through PracticeTaskStateMachine.
+
+Each transcript in benchmarks/transcripts records a lesson and, for
+each step, the task the user was on, what they typed and the result
+the service gave. The inputs are fed through the real state machine,
+talking to in-process stand-ins for the services which give the
+recorded results after a configurable latency. This checks that the
+state machine visits the recorded tasks and reports how long it took
+to respond to each input, per lesson. Each transcript is also replayed
+once with every showmehow-task-completed event failing, to check that
+failures are reported without holding up the side effects after them.
+
+This needs PyGObject, but not a session bus or either service.
+
+Usage: python benchmarks/bench_replay.py [--attempt-latency MS]
+           [--session-latency MS] [--event-latency MS] [--repeat N]
+           [TRANSCRIPT...]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_service import (MockCodingGameService, MockShowmehowService)
+
+from showmehow.prompt import ScriptedInputSource
+from showmehow.compiler import normalize_input
+from showmehow.showmehow import (ATTEMPT_CACHE,
+                                 PracticeTaskStateMachine,
+                                 TaskIndex,
+                                 load_lessons)
+from showmehow.typewriter import (Typewriter, set_default_typewriter)
+
+
+class TranscriptResponder(object):
+    """Reply to attempts with the results recorded in a transcript."""
+
+    def __init__(self, transcript):
+        """Index the transcript by task and input."""
+        super(TranscriptResponder, self).__init__()
+        self._results = {
+            (step["task"], step["input"]): (step["result"],
+                                            step.get("responses", []))
+            for step in transcript["steps"]
+        }
+        self.visited = []
+
+    def __call__(self, session, lesson, task, text):
+        """Look up the recorded result for task and text."""
+        del session
+        del lesson
+
+        self.visited.append(task)
+        return self._results.get((task, text), ("failure", []))
+
+
+def _percentile(samples, fraction):
+    """Get the sample at fraction of the way through sorted samples."""
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def replay(catalog, tasks, transcript, latency, coding_game_service=None):
+    """Replay transcript, returning the per-step latencies and elapsed time.
+
+    tasks is the TaskIndex to use as the unlocked tasks. Events go to
+    coding_game_service, or a MockCodingGameService if it is not given.
+
+    Raises AssertionError if the state machine did not visit the tasks
+    recorded in the transcript, or local matchers disagree with it.
+    """
+    responder = TranscriptResponder(transcript)
+    service = MockShowmehowService(responder, latency)
+    if coding_game_service is None:
+        coding_game_service = MockCodingGameService(latency)
+    input_source = ScriptedInputSource([step["input"]
+                                        for step in transcript["steps"]])
+    lesson = transcript["lesson"]
+
+    # Every replay starts without any results to reuse
+    ATTEMPT_CACHE.clear()
+
+    start = time.time()
+    with PracticeTaskStateMachine(service,
+                                  coding_game_service,
+                                  catalog,
+                                  lesson,
+                                  catalog.lesson(lesson).entry,
+                                  input_source=input_source,
+                                  unlocked_tasks=tasks) as machine:
+        machine.start()
+    elapsed = time.time() - start
+
+    # Tasks with local matchers never reach the service, but their
+    # results should still agree with the transcript. Neither do inputs
+    # repeated at deterministic tasks, which come from the attempt cache.
+    expected = []
+    attempted = set()
+    for step in transcript["steps"]:
+        if not catalog.checks_locally(lesson, step["task"]):
+            key = (step["task"], normalize_input(step["input"]))
+            if key not in attempted:
+                expected.append(step["task"])
+            if catalog.is_deterministic(lesson, step["task"]):
+                attempted.add(key)
+        else:
+            assert catalog.local_result(lesson,
+                                        step["task"],
+                                        step["input"]) == step["result"], \
+                "{}/{}: {!r} did not give {}".format(lesson, step["task"],
+                                                     step["input"], step["result"])
+
+    assert responder.visited == expected, \
+        "{}: visited {}, expected {}".format(lesson, responder.visited, expected)
+    assert not service.sessions, "{}: sessions left open".format(lesson)
+
+    return input_source.latencies, elapsed
+
+
+def check_failed_side_effects(catalog, tasks, transcript, latency):
+    """Check that side effects which fail are reported without holding up the rest.
+
+    Every attempt dispatches a showmehow-task-completed event, so they
+    are all made to fail. Raises AssertionError if any of them was not
+    dispatched or not reported.
+    """
+    event = "showmehow-task-completed"
+    coding_game_service = MockCodingGameService(latency, failing_events=[event])
+    real_stderr, sys.stderr = sys.stderr, StringIO()
+    try:
+        replay(catalog, tasks, transcript, latency, coding_game_service)
+    finally:
+        errors, sys.stderr = sys.stderr.getvalue(), real_stderr
+
+    steps = len(transcript["steps"])
+    dispatched = coding_game_service.events.count(event)
+    reported = errors.count("Could not dispatch {}".format(event))
+    assert dispatched == reported == steps, \
+        "{}: dispatched {} and reported {} failed events for {} attempts".format(
+            transcript["lesson"], dispatched, reported, steps
+        )
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser("Transcript replay benchmark")
+    parser.add_argument("transcripts", nargs="*", metavar="TRANSCRIPT")
+    parser.add_argument("--attempt-latency", type=float, default=20)
+    parser.add_argument("--session-latency", type=float, default=50)
+    parser.add_argument("--event-latency", type=float, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    arguments = parser.parse_args()
+
+    latency = {
+        "attempt_lesson_remote": arguments.attempt_latency / 1000.0,
+        "open_session": arguments.session_latency / 1000.0,
+        "close_session": arguments.session_latency / 1000.0,
+        "external_event": arguments.event_latency / 1000.0
+    }
+    paths = arguments.transcripts or sorted(glob.glob(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "transcripts", "*.json"
+    )))
+
+    catalog = load_lessons()
+
+    # Every lesson counts as unlocked, without going to GSettings
+    tasks = TaskIndex(catalog, [lesson.name for lesson in catalog])
+    null = open(os.devnull, "w")
+    set_default_typewriter(Typewriter(stream=null, animate=False))
+
+    results = []
+    for path in paths:
+        with open(path) as stream:
+            transcript = json.load(stream)
+
+        samples = []
+        total = 0.0
+        real_stdout, sys.stdout = sys.stdout, null
+        try:
+            check_failed_side_effects(catalog, tasks, transcript, latency)
+            for _ in range(arguments.repeat):
+                latencies, elapsed = replay(catalog, tasks, transcript, latency)
+                samples.extend(latencies)
+                total += elapsed
+        finally:
+            sys.stdout = real_stdout
+
+        results.append((transcript["lesson"], samples, total))
+
+    print("{:<12} {:>6} {:>10} {:>10} {:>12}".format("lesson", "steps",
+                                                     "p50 (ms)", "p95 (ms)",
+                                                     "steps/s"))
+    for lesson, samples, total in results:
+        print("{:<12} {:>6} {:>10.2f} {:>10.2f} {:>12.1f}".format(
+            lesson,
+            len(samples),
+            _percentile(samples, 0.5) * 1000,
+            _percentile(samples, 0.95) * 1000,
+            len(samples) / total
+        ))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,483 @@
+# /benchmarks/bench_suite.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - hot path benchmark suite
+"""Benchmark the hot paths of showmehow and compare them with baselines.
+
+Everything runs offline: GLib and Gio come from the stand-ins in
+benchmarks/stubs, whose main loop runs on a virtual clock, and the
+services from benchmarks/mock_service.py, so neither PyGObject nor a
+session bus is needed and the results are repeatable.
+
+Each benchmark that depends on the size of the curriculum is run on
+lessons.json itself and on copies of it scaled up synthetically, with
+every lesson repeated under new names, 10 and 100 times by default.
+Each benchmark is timed over several rounds, each of which batches
+enough operations to be timed reliably, alongside a fixed calibration
+workload. The median of how long it took compared with the calibration
+workload is compared with the same for the baseline recorded in
+benchmarks/baselines.json, so that a busy or slower machine does not
+look like a regression. If any benchmark is slower than its baseline by
+more than the tolerance, the suite says so and exits with a non-zero
+status.
+
+Only the benchmarks whose names start with one of the BENCHMARK
+arguments are run, if any are given. Record new baselines, after a
+deliberate change or on another machine, with --update-baselines.
+
+Usage: python benchmarks/bench_suite.py [--scale N...] [--rounds N]
+           [--tolerance FRACTION] [--update-baselines] [BENCHMARK...]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BASELINES_PATH = os.path.join(HERE, "baselines.json")
+LESSONS_PATH = os.path.join(ROOT, "showmehow", "lessons.json")
+
+# How much slower than its baseline a benchmark can be before it fails,
+# once the baseline is scaled by the calibration
+TOLERANCE = 1.0
+
+# How many times to time each benchmark, and the calibration workload
+ROUNDS = 15
+CALIBRATION_ROUNDS = 30
+
+# Each round times enough calls to take at least this long, so that
+# operations which take well under a microsecond are not lost in the
+# resolution of the timer and the overhead of timing them
+MIN_ROUND_SECONDS = 0.02
+
+SCALES = (1, 10, 100)
+
+# The benchmarks run by scaled_benchmarks, at each scale
+SCALED_BENCHMARKS = ("load_lessons.cold",
+                     "load_lessons.warm",
+                     "lesson_load",
+                     "find_task",
+                     "unlocked_task_index",
+                     "find_task_or_report_error.found",
+                     "find_task_or_report_error.unknown",
+                     "show_tasks",
+                     "transition")
+
+# Keep anything showmehow writes out of the real user directories, and
+# in memory if possible, so that the benchmarks which write files are
+# not at the mercy of the disk
+SCRATCH = tempfile.mkdtemp(prefix="showmehow-bench-",
+                           dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+os.environ["XDG_CACHE_HOME"] = os.path.join(SCRATCH, "cache")
+os.environ["XDG_CONFIG_HOME"] = os.path.join(SCRATCH, "config")
+os.environ.pop("SHOWMEHOW_TRACE", None)
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "stubs"))
+
+from gi.repository import Gio  # pylint: disable=wrong-import-position
+from mock_service import (MockCodingGameService,  # pylint: disable=wrong-import-position
+                          MockShowmehowService)
+
+from showmehow.catalog import (cache_paths,  # pylint: disable=wrong-import-position
+                               load_catalog)
+from showmehow.prompt import ScriptedInputSource  # pylint: disable=wrong-import-position
+from showmehow.showmehow import (ATTEMPT_CACHE,  # pylint: disable=wrong-import-position
+                                 PracticeTaskStateMachine,
+                                 UnlockedTaskIndex,
+                                 find_task_or_report_error,
+                                 print_lines_slowly,
+                                 show_tasks)
+from showmehow.typewriter import (Typewriter,  # pylint: disable=wrong-import-position
+                                  set_default_typewriter,
+                                  using_typewriter)
+
+
+class FakeClock(object):
+    """Stand-in for the wait function of a Typewriter, which never waits."""
+
+    def __init__(self):
+        """Start at zero."""
+        super(FakeClock, self).__init__()
+        self.now = 0.0
+
+    def __call__(self, delay):
+        """Advance the clock by delay and never skip."""
+        self.now += delay
+        return False
+
+
+def synthesize_lessons(scale, directory):
+    """Write lessons.json repeated scale times to directory.
+
+    The first copy of each lesson keeps its name and the others get a
+    suffix. Returns the path to the new lessons.json.
+    """
+    with open(LESSONS_PATH) as stream:
+        lessons = json.load(stream)
+
+    scaled = []
+    for copy in range(scale):
+        for lesson in lessons:
+            lesson = dict(lesson)
+            if copy:
+                lesson["name"] = "{}_{}".format(lesson["name"], copy)
+            scaled.append(lesson)
+
+    path = os.path.join(directory, "scale-{}".format(scale), "lessons.json")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w") as stream:
+        json.dump(scaled, stream)
+
+    return path
+
+
+def _remove_caches(path):
+    """Remove every compiled cache of the lessons at path."""
+    for cache_dir in cache_paths(path):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def _success_path(catalog, lesson):
+    """Get the inputs which take lesson from its entry to completion.
+
+    The mock service says that every attempt succeeds, so this is only
+    about tasks with local matchers, which need an input that matches.
+    """
+    inputs = []
+    task = catalog.task(lesson, catalog.lesson(lesson).entry)
+    while True:
+        inputs.append(next((matcher.pattern for matcher in task.matchers
+                            if matcher.result == "success" and
+                            matcher.type != "regex"),
+                           "input"))
+        effect = task.effects["success"]
+        if effect.completes_lesson:
+            return inputs
+
+        task = catalog.task(lesson, effect.move_to)
+
+
+def _all_tasks(catalog, lesson):
+    """Get the ids of every task in lesson reachable on success."""
+    task_ids = []
+    task = catalog.task(lesson, catalog.lesson(lesson).entry)
+    while task.id not in task_ids:
+        task_ids.append(task.id)
+        effect = task.effects["success"]
+        if effect.completes_lesson:
+            break
+        task = catalog.task(lesson, effect.move_to)
+
+    return task_ids
+
+
+def _run_lesson(catalog, unlocked_tasks, lesson, inputs):
+    """Run the state machine through lesson with inputs."""
+    service = MockShowmehowService(lambda *args: ("success", []))
+    with PracticeTaskStateMachine(service,
+                                  MockCodingGameService(),
+                                  catalog,
+                                  lesson,
+                                  catalog.lesson(lesson).entry,
+                                  input_source=ScriptedInputSource(inputs),
+                                  unlocked_tasks=unlocked_tasks) as machine:
+        machine.start()
+
+
+def _calibration_workload():
+    """Do some dict, string and sorting work, like showmehow does."""
+    words = {}
+    for index in range(2000):
+        word = "word{}".format(index % 500)
+        words[word] = words.get(word, 0) + len(word.upper())
+
+    return sorted(words.items())
+
+
+def _batch_size(timer):
+    """Get how many calls a round of timer needs to take MIN_ROUND_SECONDS.
+
+    Finding out also warms up the function which timer times.
+    """
+    number = 1
+    while timer.timeit(number) < MIN_ROUND_SECONDS:
+        number *= 2
+
+    return number
+
+
+def calibrate():
+    """Get how long the calibration workload takes on this machine.
+
+    Returns the median time in microseconds per call.
+    """
+    timer = timeit.Timer(_calibration_workload)
+    number = _batch_size(timer)
+    times = sorted(timer.repeat(CALIBRATION_ROUNDS, number))
+    return times[len(times) // 2] / number * 1000000
+
+
+def measure(function, rounds, calibration):
+    """Get the time of function in microseconds per call.
+
+    Each round also times the calibration workload, straight after
+    function, and what counts is how long function took compared with
+    it, so that the machine getting busier or quieter during the run
+    cancels out. The median of those ratios over rounds, rather than
+    the best one, is turned back into microseconds with calibration.
+    """
+    timer = timeit.Timer(function)
+    number = _batch_size(timer)
+    reference = timeit.Timer(_calibration_workload)
+    reference_number = _batch_size(reference)
+
+    ratios = []
+    for _ in range(rounds):
+        elapsed = timer.timeit(number) / number
+        ratios.append(elapsed / (reference.timeit(reference_number) /
+                                 reference_number))
+
+    ratios.sort()
+    return ratios[len(ratios) // 2] * calibration
+
+
+def scaled_benchmarks(path, timer, wanted):
+    """Run the benchmarks which depend on the size of the lessons at path.
+
+    Each benchmark is timed by timer, which returns the time of a
+    function in microseconds per call, and only the benchmarks for whose
+    names wanted returns True are run. Returns a dict mapping the name
+    of each benchmark to its time in microseconds per operation.
+    """
+    results = {}
+
+    def _measure(name, function, operations=1):
+        """Time function as the benchmark called name, if it is wanted."""
+        if wanted(name):
+            results[name] = timer(function) / operations
+
+    def _cold_load():
+        """Compile and cache the lessons from scratch."""
+        _remove_caches(path)
+        load_catalog(path)
+
+    _measure("load_lessons.cold", _cold_load)
+    _measure("load_lessons.warm", lambda: load_catalog(path))
+
+    catalog = load_catalog(path)
+    names = [lesson.name for lesson in catalog]
+
+    def _load_every_lesson():
+        """Load the tasks of every lesson from the cache."""
+        fresh = load_catalog(path)
+        for name in names:
+            fresh.task(name, fresh.lesson(name).entry)
+
+    _measure("lesson_load", _load_every_lesson, operations=len(names))
+
+    pairs = [(name, task_id)
+             for name in names
+             for task_id in _all_tasks(catalog, name)]
+    _measure("find_task",
+             lambda: [catalog.task(name, task_id) for name, task_id in pairs],
+             len(pairs))
+
+    Gio.Settings.values["unlocked-lessons"] = names
+    _measure("unlocked_task_index", lambda: UnlockedTaskIndex(catalog))
+
+    unlocked_tasks = UnlockedTaskIndex(catalog)
+    _measure("find_task_or_report_error.found",
+             lambda: [find_task_or_report_error(unlocked_tasks, name)
+                      for name in names],
+             len(names))
+    _measure("find_task_or_report_error.unknown",
+             lambda: find_task_or_report_error(unlocked_tasks, "unknown"))
+    _measure("show_tasks", lambda: show_tasks(unlocked_tasks))
+
+    # Only the original lessons are run, so that the time per transition
+    # shows how it is affected by the size of the curriculum alone.
+    with open(LESSONS_PATH) as stream:
+        originals = [lesson["name"] for lesson in json.load(stream)]
+    runs = [(name, _success_path(catalog, name)) for name in originals]
+
+    def _run_lessons():
+        """Run every lesson from its entry to completion."""
+        ATTEMPT_CACHE.clear()
+        for name, inputs in runs:
+            _run_lesson(catalog, unlocked_tasks, name, inputs)
+
+    _measure("transition",
+             _run_lessons,
+             operations=sum(len(inputs) for _, inputs in runs))
+    return results
+
+
+def typewriter_benchmarks(timer, wanted):
+    """Run the benchmarks of print_lines_slowly.
+
+    Each benchmark is timed by timer, as for scaled_benchmarks, and only
+    the benchmarks for whose names wanted returns True are run. Returns
+    a dict mapping the name of each benchmark to its time in
+    microseconds per character.
+    """
+    with open(LESSONS_PATH) as stream:
+        texts = [task["task"]
+                 for lesson in json.load(stream)
+                 for task in lesson["practice"].values()]
+    characters = sum(len(text) for text in texts)
+
+    def _print_all(typewriter):
+        """Get a function which prints every text with typewriter."""
+        def _print():
+            """Print every text."""
+            with using_typewriter(typewriter):
+                for text in texts:
+                    print_lines_slowly(text)
+
+        return _print
+
+    results = {}
+    with open(os.devnull, "w") as null:
+        typewriters = {
+            "print_lines_slowly.noninteractive": Typewriter(stream=null,
+                                                            animate=False),
+            "print_lines_slowly.fake_clock": Typewriter(stream=null,
+                                                        wait=FakeClock())
+        }
+        for name, typewriter in typewriters.items():
+            if wanted(name):
+                results[name] = timer(_print_all(typewriter)) / characters
+
+    return results
+
+
+def read_baselines():
+    """Read the stored baselines, or an empty dict if there are none."""
+    try:
+        with open(BASELINES_PATH) as stream:
+            return json.load(stream)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_baselines(baselines):
+    """Replace the stored baselines."""
+    with open(BASELINES_PATH, "w") as stream:
+        json.dump(baselines, stream, indent=4, sort_keys=True)
+        stream.write("\n")
+
+
+def compare(results, baselines, tolerance, speed):
+    """Print results against baselines, returning the names which regressed.
+
+    speed is how much longer the calibration workload takes now than
+    when the baselines were recorded.
+    """
+    regressed = []
+    print("calibration: this machine is running at {:.2f}x the speed of the "
+          "baselines".format(1 / speed))
+    print("{:<44} {:>12} {:>12} {:>7}".format("benchmark",
+                                              "baseline",
+                                              "us/op",
+                                              "ratio"))
+    for name in sorted(results):
+        baseline = baselines.get(name)
+        if baseline is not None:
+            baseline *= speed
+        else:
+            print("{:<44} {:>12} {:>12.3f} {:>7}".format(name, "-",
+                                                         results[name], "new"))
+            continue
+
+        ratio = results[name] / baseline
+        status = ""
+        if ratio > 1 + tolerance:
+            regressed.append(name)
+            status = "  REGRESSED"
+        print("{:<44} {:>12.3f} {:>12.3f} {:>6.2f}x{}".format(name,
+                                                              baseline,
+                                                              results[name],
+                                                              ratio,
+                                                              status))
+
+    return regressed
+
+
+def main():
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser("Hot path benchmark suite")
+    parser.add_argument("benchmarks",
+                        nargs="*",
+                        metavar="BENCHMARK",
+                        help="Only run benchmarks whose names start with these")
+    parser.add_argument("--scale", type=int, nargs="+", default=list(SCALES))
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--update-baselines", action="store_true")
+    arguments = parser.parse_args()
+
+    null = open(os.devnull, "w")
+    set_default_typewriter(Typewriter(stream=null, animate=False))
+
+    def _wanted(name):
+        """Return True if the benchmark called name should be run."""
+        return (not arguments.benchmarks or
+                any(name.startswith(prefix) for prefix in arguments.benchmarks))
+
+    calibration = calibrate()
+
+    def _timer(function):
+        """Time function against the calibration workload."""
+        return measure(function, arguments.rounds, calibration)
+
+    results = {}
+    try:
+        results.update(typewriter_benchmarks(_timer, _wanted))
+        for scale in arguments.scale:
+            suffix = "@{}x".format(scale)
+            if not any(_wanted(name + suffix) for name in SCALED_BENCHMARKS):
+                continue
+
+            path = synthesize_lessons(scale, SCRATCH)
+            scaled = scaled_benchmarks(path,
+                                       _timer,
+                                       lambda name: _wanted(name + suffix))
+            for name, value in scaled.items():
+                results[name + suffix] = value
+    finally:
+        shutil.rmtree(SCRATCH)
+
+    baselines = read_baselines()
+    if arguments.update_baselines:
+        # Baselines which are kept must stay relative to their calibration
+        speed = calibration / baselines.pop("calibration", calibration)
+        baselines = {name: value * speed for name, value in baselines.items()}
+        baselines.update(results)
+        baselines["calibration"] = calibration
+        write_baselines(baselines)
+        print("Updated {} baselines in {}".format(len(results), BASELINES_PATH))
+        return 0
+
+    speed = calibration / baselines.pop("calibration", calibration)
+    regressed = compare(results, baselines, arguments.tolerance, speed)
+    if regressed:
+        print("FAIL: {} benchmarks are more than {:.0f}% slower than their "
+              "baselines:".format(len(regressed), arguments.tolerance * 100))
+        for name in regressed:
+            print("    {}".format(name))
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
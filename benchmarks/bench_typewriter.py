@@ -0,0 +1,121 @@
+# /benchmarks/bench_typewriter.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - typewriter throughput benchmark
+"""Measure the throughput of the typewriter renderer.
+
+Every task description and reply in lessons.json is typed out to a
+counting stream with a fake clock, so nothing actually sleeps. This
+reports how many characters per second can be rendered, how many
+writes that takes compared to writing one character at a time, and
+checks that the simulated typing time still matches the original
+per-character pacing.
+
+Usage: python benchmarks/bench_typewriter.py [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from showmehow.typewriter import (CHARACTER_DELAY,
+                                  PAUSE_DELAYS,
+                                  Typewriter)
+
+
+class CountingStream(object):
+    """A stream which counts writes and flushes."""
+
+    def __init__(self):
+        """Initialise the counters."""
+        self.writes = 0
+        self.flushes = 0
+        self.characters = 0
+
+    def write(self, text):
+        """Count a write."""
+        self.writes += 1
+        self.characters += len(text)
+
+    def flush(self):
+        """Count a flush."""
+        self.flushes += 1
+
+
+class FakeClock(object):
+    """Accumulate delays instead of sleeping."""
+
+    def __init__(self):
+        """Start at zero."""
+        self.now = 0.0
+
+    def __call__(self, delay):
+        """Advance the clock by delay and never skip."""
+        self.now += delay
+        return False
+
+
+def _per_character_delay(text):
+    """Total delay of the original one character at a time renderer."""
+    text = text + " "
+    return sum(PAUSE_DELAYS[char]
+               if char in PAUSE_DELAYS and text[index + 1:index + 2] == " "
+               else CHARACTER_DELAY
+               for index, char in enumerate(text))
+
+
+def _lesson_texts():
+    """Get every task description and reply in lessons.json."""
+    with open(os.path.join(ROOT, "showmehow", "lessons.json")) as stream:
+        lessons = json.load(stream)
+
+    for lesson in lessons:
+        for task in lesson["practice"].values():
+            yield task["task"]
+            for effect in task["effects"].values():
+                yield effect["reply"]
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser("Typewriter throughput benchmark")
+    parser.add_argument("--repeat", type=int, default=20)
+    arguments = parser.parse_args()
+
+    texts = list(_lesson_texts())
+    stream = CountingStream()
+    clock = FakeClock()
+    typewriter = Typewriter(stream=stream, wait=clock)
+
+    start = time.time()
+    for _ in range(arguments.repeat):
+        for text in texts:
+            typewriter.write(text)
+    elapsed = time.time() - start
+
+    expected = sum(_per_character_delay(text) for text in texts) * arguments.repeat
+    print("texts:                {:10d}".format(len(texts) * arguments.repeat))
+    print("characters:           {:10d}".format(stream.characters))
+    print("writes:               {:10d}".format(stream.writes))
+    print("writes (per char):    {:10d}".format(stream.characters))
+    print("flushes:              {:10d}".format(stream.flushes))
+    print("render throughput:    {:10.0f} chars/s".format(stream.characters / elapsed))
+    print("typing time:          {:10.2f} s".format(clock.now))
+    print("typing time (before): {:10.2f} s".format(expected))
+
+    if abs(clock.now - expected) > 1e-6 * expected:
+        print("FAIL: pacing differs from one character at a time")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
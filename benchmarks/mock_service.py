@@ -0,0 +1,189 @@
+# /benchmarks/mock_service.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - in-process stand-ins for the services
+"""In-process stand-ins for ShowmehowService and CodingGameService.
+
+These implement the same methods as the generated D-Bus proxies that
+showmehow uses, replying on the main loop after a configurable latency,
+so that PracticeTaskStateMachine can be driven end to end without
+either service running.
+"""
+
+import json
+
+from showmehow.lazy import GLib
+
+
+class _AsyncResult(object):
+    """What a reply callback is given, to pass to the _finish method."""
+
+    def __init__(self, value, error):
+        """Initialise with the return value or error."""
+        super(_AsyncResult, self).__init__()
+        self.value = value
+        self.error = error
+
+
+def _finish(result):
+    """Return the value of result or raise its error."""
+    if result.error is not None:
+        raise result.error
+
+    return result.value
+
+
+class _MockProxy(object):
+    """Common parts of the stand-in proxies.
+
+    latency maps method names, without the call_ prefix, to the number
+    of seconds to wait before replying.
+    """
+
+    def __init__(self, latency=None):
+        """Initialise with the latencies to simulate."""
+        super(_MockProxy, self).__init__()
+        self._latency = latency or {}
+        self._handlers = {}
+        self._last_handler_id = 0
+        self.calls = []
+
+    def connect(self, signal, callback, *user_data):
+        """Connect callback to signal, returning the handler id."""
+        self._last_handler_id += 1
+        self._handlers.setdefault(signal, []).append((self._last_handler_id,
+                                                      callback,
+                                                      user_data))
+        return self._last_handler_id
+
+    def disconnect(self, handler_id):
+        """Disconnect the handler with handler_id."""
+        for signal, handlers in self._handlers.items():
+            self._handlers[signal] = [handler for handler in handlers
+                                      if handler[0] != handler_id]
+
+    def emit(self, signal, *args):
+        """Emit signal with args."""
+        for _, callback, user_data in list(self._handlers.get(signal, [])):
+            callback(self, *(args + user_data))
+
+    def _reply(self, method, callback, user_data, value=None, error=None,
+               cancellable=None):
+        """Call callback with the result of method after its latency.
+
+        If cancellable was cancelled by then, the reply is an error.
+        """
+        self.calls.append(method)
+
+        def _on_timeout():
+            """Deliver the reply."""
+            if cancellable is not None and cancellable.is_cancelled():
+                callback(self,
+                         _AsyncResult(None, GLib.Error("Operation was cancelled")),
+                         *user_data)
+            else:
+                callback(self, _AsyncResult(value, error), *user_data)
+            return False
+
+        GLib.timeout_add(int(self._latency.get(method, 0) * 1000), _on_timeout)
+
+
+class MockShowmehowService(_MockProxy):
+    """Stand-in for the ShowmehowService proxy.
+
+    responder is called with the session, lesson, task and input of
+    each attempt and returns the (result, responses) pair to reply with.
+    """
+
+    def __init__(self, responder, latency=None):
+        """Initialise with the responder."""
+        super(MockShowmehowService, self).__init__(latency)
+        self._responder = responder
+        self._last_session = 0
+        self.sessions = set()
+
+    def call_get_warnings(self, cancellable, callback, *user_data):
+        """Reply with no warnings."""
+        del cancellable
+        self._reply("get_warnings", callback, user_data, value=[])
+
+    def call_get_warnings_finish(self, result):
+        """Finish getting warnings."""
+        return _finish(result)
+
+    def call_open_session(self, lesson, cancellable, callback, *user_data):
+        """Open a new session."""
+        del lesson
+        del cancellable
+
+        self._last_session += 1
+        self.sessions.add(self._last_session)
+        self._reply("open_session", callback, user_data,
+                    value=self._last_session)
+
+    def call_open_session_finish(self, result):
+        """Finish opening a session."""
+        return _finish(result)
+
+    def call_close_session(self, session, cancellable, callback, *user_data):
+        """Close session."""
+        del cancellable
+
+        self.sessions.discard(session)
+        self._reply("close_session", callback, user_data, value=-1)
+
+    def call_close_session_finish(self, result):
+        """Finish closing a session."""
+        return _finish(result)
+
+    def call_attempt_lesson_remote(self, session, lesson, task, text,
+                                   cancellable, callback, *user_data):
+        """Attempt task in lesson with text."""
+        if session != -1 and session not in self.sessions:
+            self._reply("attempt_lesson_remote", callback, user_data,
+                        error=GLib.Error("No such session {}".format(session)),
+                        cancellable=cancellable)
+            return
+
+        result, responses = self._responder(session, lesson, task, text)
+        self._reply("attempt_lesson_remote", callback, user_data,
+                    value=json.dumps({
+                        "result": result,
+                        "responses": responses
+                    }),
+                    cancellable=cancellable)
+
+    def call_attempt_lesson_remote_finish(self, result):
+        """Finish attempting a task."""
+        return _finish(result)
+
+
+class MockCodingGameService(_MockProxy):
+    """Stand-in for the CodingGameService proxy, recording events.
+
+    Dispatching any of failing_events fails with an error.
+    """
+
+    def __init__(self, latency=None, failing_events=()):
+        """Initialise."""
+        super(MockCodingGameService, self).__init__(latency)
+        self._failing_events = failing_events
+        self.events = []
+
+    def call_external_event(self, event, cancellable, callback, *user_data):
+        """Record event."""
+        del cancellable
+
+        self.events.append(event)
+        if event in self._failing_events:
+            self._reply("external_event", callback, user_data,
+                        error=GLib.Error("Could not handle {}".format(event),
+                                         "mock-coding-game-service",
+                                         1))
+        else:
+            self._reply("external_event", callback, user_data)
+
+    def call_external_event_finish(self, result):
+        """Finish dispatching an event."""
+        return _finish(result)
@@ -0,0 +1,21 @@
+# /benchmarks/stubs/gi/__init__.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - stand-in for PyGObject in benchmarks
+"""Stand-in for the parts of PyGObject that showmehow uses.
+
+This lets the benchmarks run without PyGObject, typelibs or a session
+bus, and makes them repeatable: the main loop runs on a virtual clock,
+so timeouts fire as soon as nothing else is ready, and settings are
+kept in memory. Only GLib and Gio are provided. The service proxies
+come from benchmarks/mock_service.py instead.
+
+Put the directory containing this package first on sys.path to use it.
+"""
+
+
+def require_version(namespace, version):
+    """Accept any version of any namespace."""
+    del namespace
+    del version
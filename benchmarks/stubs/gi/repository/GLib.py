@@ -0,0 +1,158 @@
+# /benchmarks/stubs/gi/repository/GLib.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - stand-in for GLib in benchmarks
+"""A main loop running on a virtual clock.
+
+Sources are kept in a heap ordered by when they are due. When nothing
+is due, the clock jumps straight to the next source rather than
+sleeping, so simulated service latencies cost no real time and the
+benchmarks only measure the work showmehow does. File descriptor
+watches are not supported.
+"""
+
+import heapq
+import itertools
+
+
+PRIORITY_DEFAULT = 0
+IO_IN = 1
+IO_HUP = 16
+
+
+class Error(Exception):
+    """A GLib.Error with a domain and code."""
+
+    def __init__(self, message="", domain="", code=0):
+        """Initialise with the message, domain and code."""
+        super(Error, self).__init__(message)
+        self.message = message
+        self.domain = domain
+        self.code = code
+
+    def matches(self, domain, code):
+        """Return True if this error is code in domain."""
+        return self.domain == domain and self.code == code
+
+
+class _Clock(object):
+    """The virtual time, in seconds."""
+
+    def __init__(self):
+        """Start at zero."""
+        super(_Clock, self).__init__()
+        self.now = 0.0
+
+
+CLOCK = _Clock()
+
+_SOURCE_IDS = itertools.count(1)
+_SOURCES = []
+_REMOVED = set()
+
+
+def _add(interval, function, args):
+    """Add a source which calls function with args every interval seconds."""
+    source_id = next(_SOURCE_IDS)
+    heapq.heappush(_SOURCES, (CLOCK.now + interval, source_id, interval,
+                              function, args))
+    return source_id
+
+
+def idle_add(function, *args, **kwargs):
+    """Call function with args when nothing else is due."""
+    del kwargs
+    return _add(0, function, args)
+
+
+def timeout_add(interval, function, *args, **kwargs):
+    """Call function with args every interval milliseconds."""
+    del kwargs
+    return _add(interval / 1000.0, function, args)
+
+
+def source_remove(source_id):
+    """Remove the source with source_id."""
+    _REMOVED.add(source_id)
+    return True
+
+
+def io_add_watch(*args, **kwargs):
+    """File descriptor watches are not supported."""
+    del args
+    del kwargs
+    raise NotImplementedError("The GLib stand-in cannot watch file descriptors")
+
+
+class MainContext(object):
+    """The one and only main context."""
+
+    _DEFAULT = None
+
+    @classmethod
+    def default(cls):
+        """Get the default main context."""
+        if cls._DEFAULT is None:
+            cls._DEFAULT = cls()
+
+        return cls._DEFAULT
+
+    def iteration(self, may_block):
+        """Dispatch the next due source, returning True if one was dispatched.
+
+        If may_block is True and nothing is due yet, the clock moves on
+        to the next source.
+        """
+        del self
+
+        while _SOURCES:
+            due, source_id, interval, function, args = _SOURCES[0]
+            if source_id in _REMOVED:
+                heapq.heappop(_SOURCES)
+                _REMOVED.discard(source_id)
+                continue
+
+            if due > CLOCK.now:
+                if not may_block:
+                    return False
+                CLOCK.now = due
+
+            heapq.heappop(_SOURCES)
+            if function(*args):
+                heapq.heappush(_SOURCES, (CLOCK.now + interval, source_id,
+                                          interval, function, args))
+            return True
+
+        return False
+
+
+class MainLoop(object):
+    """A main loop on the default main context."""
+
+    def __init__(self, *args):
+        """Initialise, not running."""
+        del args
+        super(MainLoop, self).__init__()
+        self._running = False
+
+    def run(self):
+        """Dispatch sources until quit() is called.
+
+        Raises RuntimeError if there is nothing left which could
+        ever call quit().
+        """
+        self._running = True
+        context = MainContext.default()
+        while self._running:
+            if not context.iteration(True):
+                self._running = False
+                raise RuntimeError("The main loop has nothing left to do")
+
+    def quit(self):
+        """Stop running."""
+        self._running = False
+
+    def is_running(self):
+        """Return True if the loop is running."""
+        return self._running
@@ -0,0 +1,101 @@
+# /benchmarks/stubs/gi/repository/Gio.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - stand-in for Gio in benchmarks
+"""In-memory settings and cancellables.
+
+All Settings objects share one set of values, which benchmarks fill in
+through Settings.values before creating any, and set_value notifies
+every Settings object, as GSettings would.
+"""
+
+
+class BusType(object):
+    """Bus types."""
+
+    SESSION = 0
+
+
+class _Signals(object):
+    """Signal connection and emission."""
+
+    _LAST_HANDLER_ID = [0]
+
+    def __init__(self):
+        """Initialise with no handlers."""
+        super(_Signals, self).__init__()
+        self._handlers = {}
+
+    def connect(self, signal, callback, *user_data):
+        """Connect callback to signal, returning the handler id."""
+        self._LAST_HANDLER_ID[0] += 1
+        self._handlers.setdefault(signal, []).append((self._LAST_HANDLER_ID[0],
+                                                      callback,
+                                                      user_data))
+        return self._LAST_HANDLER_ID[0]
+
+    def disconnect(self, handler_id):
+        """Disconnect the handler with handler_id."""
+        for signal, handlers in self._handlers.items():
+            self._handlers[signal] = [handler for handler in handlers
+                                      if handler[0] != handler_id]
+
+    def emit(self, signal, *args):
+        """Call the handlers of signal with args."""
+        for _, callback, user_data in list(self._handlers.get(signal, [])):
+            callback(self, *(args + user_data))
+
+
+class Settings(_Signals):
+    """Settings for any schema, kept in memory."""
+
+    values = {}
+    _INSTANCES = []
+
+    @classmethod
+    def new(cls, schema):
+        """Create settings for schema."""
+        del schema
+
+        settings = cls()
+        cls._INSTANCES.append(settings)
+        return settings
+
+    def get_value(self, key):
+        """Get the value of key."""
+        return list(self.values[key])
+
+    def get_strv(self, key):
+        """Get the value of key."""
+        return list(self.values[key])
+
+    def set_value(self, key, value):
+        """Change the value of key and notify every Settings object."""
+        Settings.values[key] = list(value)
+        for settings in self._INSTANCES:
+            settings.emit("changed::" + key, key)
+
+
+class Cancellable(_Signals):
+    """A cancellable operation."""
+
+    def __init__(self):
+        """Initialise, not cancelled."""
+        super(Cancellable, self).__init__()
+        self._cancelled = False
+
+    @classmethod
+    def new(cls):
+        """Create a cancellable."""
+        return cls()
+
+    def cancel(self):
+        """Cancel, once."""
+        if not self._cancelled:
+            self._cancelled = True
+            self.emit("cancelled")
+
+    def is_cancelled(self):
+        """Return True if this was cancelled."""
+        return self._cancelled
@@ -0,0 +1,6 @@
+# /benchmarks/stubs/gi/repository/__init__.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - stand-in for gi.repository in benchmarks
+"""Stand-ins for the gi.repository modules that showmehow uses."""
@@ -6,7 +6,27 @@
 # All rights reserved.
 """Installation and setup script for parse-shebang."""
 
+import os
+
+from distutils.errors import DistutilsError
 from setuptools import find_packages, setup
+from setuptools.command.build_py import build_py
+
+
+class BuildPyWithCompiledLessons(build_py):
+    """Validate lessons.json and build its compiled cache alongside it."""
+
+    def run(self):
+        """Build the package, then compile the lessons into it."""
+        build_py.run(self)
+
+        from showmehow.compiler import main as compile_lessons
+
+        output = os.path.join(self.build_lib, "showmehow", "lessons.catalog")
+        if compile_lessons([os.path.join("showmehow", "lessons.json"),
+                            "--output", output]) != 0:
+            raise DistutilsError("showmehow/lessons.json is invalid")
+
 
 setup(name="showmehow",
       version="0.0.0",
@@ -34,8 +54,12 @@ setup(name="showmehow",
       entry_points={
           "console_scripts": [
               "showmehow=showmehow.showmehow:main",
-              "remindmehow=showmehow.remindmehow:main"
+              "showmehow-complete=showmehow.completion:main",
+              "remindmehow=showmehow.remindmehow:main",
+              "showmehow-daemon=showmehow.daemon:main",
+              "showmehow-client=showmehow.client:main"
           ]
       },
+      cmdclass={"build_py": BuildPyWithCompiledLessons},
       zip_safe=True,
       include_package_data=True)
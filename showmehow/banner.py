@@ -0,0 +1,58 @@
+# /showmehow/banner.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - first run banner
+"""The banner which is shown the first time that showmehow runs.
+
+This only needs the typewriter, so that the thin client can show it
+without importing the rest of showmehow.
+"""
+
+import errno
+import os
+
+from showmehow.paths import user_config_dir
+from showmehow.typewriter import default_typewriter
+
+
+_BANNER_STATUSES = (
+    ("[STATUS] Loading", 0.2),
+    ("[STATUS] Fetching content", 0.4),
+    ("[STATUS] Transforming system", 0.1)
+)
+
+
+def print_banner():
+    """Print a small banner informing the user how to continue.
+
+    However, we don't want to print this banner if we have already run.
+    """
+    first_run_file = os.path.join(user_config_dir(), '.first-run')
+    if os.path.exists(first_run_file):
+        return
+
+    # Write the file - it is okay if the containing directory exists
+    try:
+        os.makedirs(os.path.dirname(first_run_file))
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise error
+
+    with open(first_run_file, 'w') as fileobj:
+        fileobj.write('')
+
+    # Pressing a key skips the rest of the waiting
+    skipped = False
+    for status, delay in _BANNER_STATUSES:
+        print(status)
+        skipped = skipped or default_typewriter().pause(delay)
+
+    print("""[DONE]\n\n"""
+          """Welcome to 'showmehow'!\n"""
+          """\n""",
+          """We'll show you what's behind the curtains on your system.\n"""
+          """\n"""
+          """To exit at any time, type 'exit' or 'quit' and press 'enter'.\n"""
+          """Have a lot of fun!\n"""
+          """\n\n""")
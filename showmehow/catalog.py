@@ -0,0 +1,463 @@
+# /showmehow/catalog.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - compiled lesson catalog
+"""Compiled lesson catalog, cached on disk next to lessons.json.
+
+Parsing lessons.json and scanning it for a lesson on every lookup gets
+slower as the curriculum grows. Instead, lessons.json is compiled once
+into a catalog with Lessons keyed by name and the Tasks of each lesson
+keyed by id, with the Effects of each result (see showmehow.compiler
+and showmehow.model).
+
+The compiled catalog is cached in a directory of files which are mapped
+into memory when needed. A small manifest holds the Lessons without
+their tasks, which is all that listing lessons needs. The Tasks of each
+lesson go in a shard of their own, which is only read the first time
+that lesson is entered. The manifest header records
+the mtime, size and hash of lessons.json, so a stale cache is ignored.
+The cache is normally written at build time, so it ships with showmehow.
+
+When lessons.json changes, a catalog can be updated in place from a
+freshly loaded one. Shards are named after the hash of their contents,
+so the lessons which changed are found without loading any tasks, and
+only what was built from those lessons has to be thrown away.
+"""
+
+import errno
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import time
+
+from collections import (OrderedDict, namedtuple)
+
+from showmehow.compiler import (compile_lesson,
+                                compile_tasks,
+                                evaluate_matchers,
+                                validate_lessons)
+from showmehow.paths import user_cache_dir
+from showmehow.tracing import TRACE
+
+
+_CACHE_MAGIC = b"SMHC"
+_SHARD_MAGIC = b"SMHS"
+_CACHE_VERSION = 8
+
+# magic, format version, source mtime, source size, source sha1
+_CACHE_HEADER = struct.Struct("<4sIdq20s")
+
+# magic, format version
+_SHARD_HEADER = struct.Struct("<4sI")
+
+_MANIFEST_NAME = "manifest"
+_SHARD_SUFFIX = ".shard"
+
+# How long to keep shards which the manifest no longer refers to, in
+# seconds, since a process which read an older manifest might need them
+_SHARD_MAX_AGE = 7 * 24 * 60 * 60
+
+
+CompiledLessons = namedtuple("CompiledLessons", "order lessons shards digest")
+
+
+class StaleCatalogError(Exception):
+    """The tasks of a lesson are gone from the cache and lessons.json changed."""
+
+    def __init__(self, lesson):
+        """Initialise with the name of the lesson."""
+        super(StaleCatalogError, self).__init__(
+            "Tasks for {} are no longer cached and the lessons have "
+            "changed since they were loaded".format(lesson)
+        )
+
+
+class LessonCatalog(object):
+    """An indexed collection of lessons.
+
+    Iterating over the catalog yields the Lessons in the order that
+    they appear in lessons.json. The Tasks of each lesson are returned
+    by load_shard, which is called the first time that something in
+    the lesson is looked up. shard_ids maps each lesson name to the
+    name of its shard, which changes whenever its Tasks do.
+    """
+
+    def __init__(self, order, lessons, load_shard, shard_ids):
+        """Initialise with the lesson names in order and their Lessons."""
+        super(LessonCatalog, self).__init__()
+
+        self._order = order
+        self._lessons = lessons
+        self._load_shard = load_shard
+        self._shard_ids = shard_ids
+        self._shards = {}
+        self._reloaded_handlers = OrderedDict()
+        self._last_handler_id = 0
+
+    def __iter__(self):
+        """Iterate over Lessons in order."""
+        return (self._lessons[name] for name in self._order)
+
+    def __len__(self):
+        """Return the number of lessons."""
+        return len(self._order)
+
+    def __contains__(self, lesson):
+        """Return True if there is a lesson called lesson."""
+        return lesson in self._lessons
+
+    def _shard(self, lesson):
+        """Get the shard for lesson, loading it if needed."""
+        try:
+            return self._shards[lesson]
+        except KeyError:
+            with TRACE.span("lesson.load", lesson=lesson):
+                shard = self._shards[lesson] = self._load_shard(lesson)
+            return shard
+
+    def connect_reloaded(self, callback):
+        """Call callback whenever lessons change in update, returning its id.
+
+        callback is called with the catalog and the set of names of
+        the lessons which were added, removed or changed.
+        """
+        self._last_handler_id += 1
+        self._reloaded_handlers[self._last_handler_id] = callback
+        return self._last_handler_id
+
+    def disconnect_reloaded(self, handler_id):
+        """Stop calling the callback connected as handler_id."""
+        self._reloaded_handlers.pop(handler_id, None)
+
+    def update(self, catalog):
+        """Replace the lessons with those of catalog, loaded from the same source.
+
+        The Tasks of lessons which did not change are kept, rather than
+        loaded again. Returns the set of names of the lessons which were
+        added, removed or changed, after telling the reloaded callbacks.
+        """
+        # pylint: disable=protected-access
+        changed = set(self._lessons) ^ set(catalog._lessons)
+        changed.update(name for name in self._lessons
+                       if name in catalog._lessons and
+                       (self._lessons[name] != catalog._lessons[name] or
+                        self._shard_ids[name] != catalog._shard_ids[name]))
+
+        self._order = catalog._order
+        self._lessons = catalog._lessons
+        self._load_shard = catalog._load_shard
+        self._shard_ids = catalog._shard_ids
+        for name in [name for name in self._shards if name in changed]:
+            del self._shards[name]
+
+        if changed:
+            for callback in list(self._reloaded_handlers.values()):
+                callback(self, changed)
+
+        return changed
+
+    def is_loaded(self, lesson):
+        """Return True if the tasks in lesson have been loaded."""
+        return lesson in self._shards
+
+    def lesson(self, lesson):
+        """Get the Lesson called lesson."""
+        return self._lessons[lesson]
+
+    def task(self, lesson, task):
+        """Get the Task called task in lesson."""
+        return self._shard(lesson)[task]
+
+    def transition(self, lesson, task, result):
+        """Get the Effect of result at task in lesson."""
+        return self._shard(lesson)[task].effects[result]
+
+    def steps_to_completion(self, lesson, task):
+        """Get the smallest number of attempts to complete lesson from task."""
+        return self._shard(lesson)[task].steps
+
+    def checks_locally(self, lesson, task):
+        """Return True if attempts at task in lesson are checked in-process."""
+        return bool(self._shard(lesson)[task].matchers)
+
+    def local_result(self, lesson, task, text):
+        """Get the result of attempting task in lesson with text.
+
+        The task must have local matchers, see checks_locally.
+        """
+        return evaluate_matchers(self._shard(lesson)[task].matchers, text)
+
+    def is_deterministic(self, lesson, task):
+        """Return True if results at task in lesson can be reused."""
+        return self._shard(lesson)[task].deterministic
+
+    def vocabulary(self, lesson, task):
+        """Get the sorted words that the user might type at task in lesson."""
+        return self._shard(lesson)[task].vocabulary
+
+
+def _source_identity(source_path):
+    """Return the (mtime, size) pair for source_path."""
+    stat = os.stat(source_path)
+    return (stat.st_mtime, stat.st_size)
+
+
+def _source_digest(source_path):
+    """Return the sha1 digest of the contents of source_path."""
+    with open(source_path, "rb") as source_stream:
+        return hashlib.sha1(source_stream.read()).digest()
+
+
+def cache_paths(source_path):
+    """Get the candidate cache directories for source_path, in order of preference.
+
+    The first is next to the source file itself. That directory is not
+    writable on system installations, so fall back to the user cache.
+    """
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return [
+        os.path.join(os.path.dirname(os.path.abspath(source_path)),
+                     stem + ".catalog"),
+        os.path.join(user_cache_dir(), stem + ".catalog")
+    ]
+
+
+def _map_file(path):
+    """Map the file at path into memory, or return None if it can't be read."""
+    try:
+        with open(path, "rb") as stream:
+            return mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _unpickle(data):
+    """Unpickle data, returning None if it is truncated or corrupt."""
+    try:
+        return pickle.loads(data)
+    except Exception:  # pylint: disable=broad-except
+        # Unpickling a truncated or corrupt file can fail in
+        # any number of ways. In all of them we just recompile.
+        return None
+
+
+def _read_shard(shard_path):
+    """Read the shard at shard_path, or return None if it is unusable."""
+    shard_map = _map_file(shard_path)
+    if shard_map is None:
+        return None
+
+    try:
+        if len(shard_map) < _SHARD_HEADER.size:
+            return None
+
+        if _SHARD_HEADER.unpack_from(shard_map, 0) != (_SHARD_MAGIC, _CACHE_VERSION):
+            return None
+
+        return _unpickle(shard_map[_SHARD_HEADER.size:])
+    finally:
+        shard_map.close()
+
+
+def _shard_loader(cache_dir, source_path, shard_files, digest):
+    """Get a function which loads the shard for a lesson from cache_dir.
+
+    digest is the hash of the source which the manifest was read for.
+    """
+    compiled = []
+
+    def load_shard(lesson):
+        """Load the shard for lesson, compiling it again if it is unusable.
+
+        Raises StaleCatalogError if it has to be compiled again, but the
+        source has changed since the manifest was read.
+        """
+        shard = _read_shard(os.path.join(cache_dir, shard_files[lesson]))
+        if shard is not None:
+            return shard
+
+        # Another process might have removed the shard since the manifest
+        # was read, so go back to the source, compiling it only once.
+        if not compiled:
+            compiled.append(compile_lessons(source_path))
+
+        if compiled[0].digest != digest:
+            raise StaleCatalogError(lesson)
+
+        return compiled[0].shards[lesson]
+
+    return load_shard
+
+
+def read_cache(cache_dir, source_path):
+    """Read the manifest of a compiled catalog from cache_dir.
+
+    Returns a LessonCatalog which reads lesson shards from cache_dir on
+    demand, or None if the cache is missing, unreadable or no longer
+    matches source_path.
+    """
+    manifest_map = _map_file(os.path.join(cache_dir, _MANIFEST_NAME))
+    if manifest_map is None:
+        return None
+
+    try:
+        if len(manifest_map) < _CACHE_HEADER.size:
+            return None
+
+        magic, version, mtime, size, digest = _CACHE_HEADER.unpack_from(manifest_map, 0)
+        if magic != _CACHE_MAGIC or version != _CACHE_VERSION:
+            return None
+
+        # A matching mtime and size is good enough. If they changed, the
+        # file might have just been touched, so fall back to the hash.
+        if (mtime, size) != _source_identity(source_path):
+            if digest != _source_digest(source_path):
+                return None
+
+        manifest = _unpickle(manifest_map[_CACHE_HEADER.size:])
+    finally:
+        manifest_map.close()
+
+    if manifest is None:
+        return None
+
+    order, lessons, shard_files = manifest
+    return LessonCatalog(order,
+                         lessons,
+                         _shard_loader(cache_dir, source_path, shard_files, digest),
+                         shard_files)
+
+
+def _write_atomically(path, header, payload):
+    """Write header and payload to path, replacing it atomically."""
+    fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                          prefix=".lessons-")
+    try:
+        os.chmod(temporary_path, 0o644)
+        with os.fdopen(fd, "wb") as stream:
+            stream.write(header)
+            stream.write(payload)
+        os.rename(temporary_path, path)
+    except Exception:
+        os.unlink(temporary_path)
+        raise
+
+
+def _pickle_shards(compiled):
+    """Pickle the shards of CompiledLessons.
+
+    Returns a dict mapping each lesson name to the name of its shard
+    file, which is the hash of its contents, and the pickled shard.
+    """
+    pickled = {}
+    for name in compiled.order:
+        payload = pickle.dumps(compiled.shards[name], pickle.HIGHEST_PROTOCOL)
+        pickled[name] = (hashlib.sha1(payload).hexdigest() + _SHARD_SUFFIX,
+                         payload)
+
+    return pickled
+
+
+def write_cache(cache_dir, source_path, compiled, pickled=None):
+    """Write the CompiledLessons for source_path to cache_dir.
+
+    Shards are named after the hash of their contents, so unchanged
+    lessons are not written again and the shards referred to by an
+    existing manifest are never overwritten. The manifest is replaced
+    last. Shards which it does not refer to might still be needed by
+    processes which read an older manifest, so they are only removed
+    once no manifest has referred to them for _SHARD_MAX_AGE. pickled
+    is the shards from _pickle_shards, if they were already pickled.
+
+    Returns True if the cache was written.
+    """
+    mtime, size = _source_identity(source_path)
+    header = _CACHE_HEADER.pack(_CACHE_MAGIC, _CACHE_VERSION, mtime, size,
+                                compiled.digest)
+    shard_header = _SHARD_HEADER.pack(_SHARD_MAGIC, _CACHE_VERSION)
+    shard_files = {}
+    if pickled is None:
+        pickled = _pickle_shards(compiled)
+
+    try:
+        try:
+            os.makedirs(cache_dir)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise error
+
+        for name in compiled.order:
+            shard_file, payload = pickled[name]
+            shard_path = os.path.join(cache_dir, shard_file)
+            if not os.path.exists(shard_path):
+                _write_atomically(shard_path, shard_header, payload)
+            else:
+                # Record that the shard is still in use
+                os.utime(shard_path, None)
+            shard_files[name] = shard_file
+
+        _write_atomically(os.path.join(cache_dir, _MANIFEST_NAME),
+                          header,
+                          pickle.dumps((compiled.order,
+                                        compiled.lessons,
+                                        shard_files),
+                                       pickle.HIGHEST_PROTOCOL))
+
+        in_use = set(shard_files.values())
+        expired = time.time() - _SHARD_MAX_AGE
+        for filename in os.listdir(cache_dir):
+            if filename.endswith(_SHARD_SUFFIX) and filename not in in_use:
+                shard_path = os.path.join(cache_dir, filename)
+                try:
+                    if os.path.getmtime(shard_path) < expired:
+                        os.unlink(shard_path)
+                except OSError:
+                    pass
+    except (IOError, OSError):
+        return False
+
+    return True
+
+
+def compile_lessons(source_path):
+    """Validate and compile source_path into CompiledLessons.
+
+    Raises LessonValidationError if the lessons have mistakes in them.
+    """
+    with open(source_path, "rb") as source_stream:
+        contents = source_stream.read()
+
+    lessons = json.loads(contents.decode("utf-8"))
+    validate_lessons(lessons)
+    return CompiledLessons(
+        [lesson["name"] for lesson in lessons],
+        {lesson["name"]: compile_lesson(lesson) for lesson in lessons},
+        {lesson["name"]: compile_tasks(lesson) for lesson in lessons},
+        hashlib.sha1(contents).digest()
+    )
+
+
+def load_catalog(source_path):
+    """Load the catalog for source_path, compiling and caching it if needed."""
+    candidates = cache_paths(source_path)
+    for cache_dir in candidates:
+        catalog = read_cache(cache_dir, source_path)
+        if catalog is not None:
+            return catalog
+
+    compiled = compile_lessons(source_path)
+    pickled = _pickle_shards(compiled)
+    for cache_dir in candidates:
+        if write_cache(cache_dir, source_path, compiled, pickled):
+            break
+
+    return LessonCatalog(compiled.order,
+                         compiled.lessons,
+                         compiled.shards.__getitem__,
+                         {name: shard_file
+                          for name, (shard_file, _) in pickled.items()})
@@ -0,0 +1,51 @@
+# /showmehow/checkpoint.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - progress checkpoint
+"""Where the user got to in a lesson, so that they can pick up from there.
+
+Every time the user moves on to another task, the lesson and task are
+written to a small state file in the user configuration directory.
+Starting the same lesson again goes straight to that task, rather than
+going through all of the earlier tasks again. The checkpoint is removed
+once the lesson is completed.
+"""
+
+import json
+import os
+import time
+
+from showmehow.paths import (user_config_dir, write_atomically)
+
+
+def checkpoint_path():
+    """Get the path to the progress checkpoint."""
+    return os.path.join(user_config_dir(), "checkpoint.json")
+
+
+def write_checkpoint(lesson, task):
+    """Record that the user is at task in lesson."""
+    write_atomically(checkpoint_path(), json.dumps({
+        "lesson": lesson,
+        "task": task,
+        "time": time.time()
+    }))
+
+
+def read_checkpoint():
+    """Get the (lesson, task) that the user was at, or None."""
+    try:
+        with open(checkpoint_path()) as checkpoint_stream:
+            checkpoint = json.load(checkpoint_stream)
+        return (checkpoint["lesson"], checkpoint["task"])
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def clear_checkpoint():
+    """Remove the checkpoint, since the lesson was completed."""
+    try:
+        os.unlink(checkpoint_path())
+    except OSError:
+        pass
@@ -0,0 +1,139 @@
+# /showmehow/client.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - thin client for the daemon
+"""Thin client which runs showmehow sessions in the showmehow daemon.
+
+This only imports what it needs to talk to the daemon and type out
+text, so it starts quickly and stays small. Words are completed from
+the vocabulary which the daemon sends with each prompt. If the daemon
+is not running, showmehow is run in this process instead, as it is for
+NONINTERACTIVE, --help and options which only showmehow itself
+understands.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+from showmehow.banner import print_banner
+from showmehow.completer import WordCompleter
+from showmehow.paths import daemon_socket_path
+from showmehow.prompt import configure_readline
+from showmehow.typewriter import (default_typewriter,
+                                  stdout_is_tty,
+                                  terminal_width)
+
+# Assign 'input' to raw_input if running on Python 2
+try:
+    input = raw_input
+except NameError:
+    pass
+
+
+def _read_line(prompt, completer):
+    """Read a line from the user, or None at the end of input."""
+    import readline
+
+    configure_readline()
+    readline.set_completer(completer.complete)
+    try:
+        return input(prompt)
+    except (EOFError, KeyboardInterrupt):
+        return None
+
+
+def run_session(client_socket, arguments):
+    """Run a session for arguments in the daemon, returning its exit status.
+
+    Pressing Ctrl-C while the daemon has the session has it cancel the
+    attempt being checked, or end the session if there is none.
+    """
+    def _send(message):
+        """Send message to the daemon."""
+        client_socket.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+    _send({
+        "start": True,
+        "task": arguments.task,
+        "colour": stdout_is_tty(),
+        "width": terminal_width(),
+        "restart": arguments.restart,
+        "attempt_timeout": arguments.attempt_timeout,
+        "attempt_retries": arguments.attempt_retries
+    })
+
+    typewriter = default_typewriter()
+    completer = WordCompleter()
+    stream = client_socket.makefile("rb")
+    while True:
+        try:
+            line = stream.readline()
+            if not line:
+                return 0
+
+            message = json.loads(line.decode("utf-8"))
+            if "write" in message:
+                typewriter.write(message["write"],
+                                 newline=message.get("newline", True))
+            elif "dots" in message:
+                typewriter.dots(message["dots"], message.get("interval", 1))
+            elif "show" in message:
+                typewriter.show(message["show"])
+            elif "banner" in message:
+                print_banner()
+            elif "prompt" in message:
+                completer.update(message.get("vocabulary", []),
+                                 message.get("tasks", []))
+                _send({"line": _read_line(message["prompt"], completer)})
+            elif "exit" in message:
+                return message["exit"]
+        except KeyboardInterrupt:
+            _send({"cancel": True})
+
+
+def _run_in_process(argv):
+    """Run showmehow in this process, rather than in the daemon."""
+    from showmehow.showmehow import main as run_in_process
+    return run_in_process(argv)
+
+
+def main(argv=None):
+    """Entry point for the thin client."""
+    # Canned output is all that is wanted without a terminal
+    if os.environ.get("NONINTERACTIVE"):
+        return _run_in_process(argv)
+
+    # Anything else, including --help, is left to showmehow itself
+    parser = argparse.ArgumentParser('showmehow - Show me how to do things',
+                                     add_help=False)
+    parser.add_argument('task', nargs='?', type=str)
+    parser.add_argument('--restart', action='store_true')
+    parser.add_argument('--attempt-timeout', type=float)
+    parser.add_argument('--attempt-retries', type=int)
+    arguments, unknown = parser.parse_known_args(argv or sys.argv[1:])
+
+    if unknown:
+        # These are options which only showmehow itself understands
+        return _run_in_process(argv)
+
+    client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client_socket.connect(daemon_socket_path())
+    except socket.error:
+        client_socket.close()
+        return _run_in_process(argv)
+
+    try:
+        return run_session(client_socket, arguments)
+    except (KeyboardInterrupt, socket.error):
+        return 1
+    finally:
+        client_socket.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,410 @@
+# /showmehow/compiler.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - lesson graph compiler
+"""Validate lessons.json and compile it into lessons, tasks and effects.
+
+Each lesson's practice section is a graph of tasks, where the effect
+of each attempt result may move to another task or complete the lesson.
+Mistakes in that graph used to only show up deep inside the state
+machine. The compiler checks the whole graph up front and compiles each
+lesson into the objects in showmehow.model, with the defaults of every
+effect filled in, along with the shortest number of steps from each
+task to completing the lesson.
+
+Tasks whose answers can be checked without the service can also declare
+local matchers, which are compiled here so that they can be evaluated
+in-process:
+
+    "matchers": [
+        {"type": "normalized", "pattern": "ls", "result": "success"}
+    ]
+
+The first matcher to match the input gives the result, and if none of
+them match, the result is "failure". An exact matcher compares the
+input as it is, a normalized one ignores surrounding whitespace and
+runs of whitespace within it, and a regex one must match all of it.
+
+Attempts at other tasks are checked by the service. Many of those run
+what was typed, which might give a different result each time or
+change something, so they are checked every time. Tasks where the
+service only checks the text can say so with "deterministic": true, so
+that the result of an attempt is reused for the same input.
+
+Tasks can also list the words that they expect the user to type, which
+are offered by tab completion at the prompt, along with the words of
+their exact and normalized matcher patterns:
+
+    "vocabulary": ["gsettings", "list-keys", "org.gnome.desktop.interface"]
+
+Run as a script to check a lessons file and write its compiled cache:
+
+    python -m showmehow.compiler [LESSONS_JSON]
+"""
+
+import re
+import sys
+
+from collections import (defaultdict, deque, namedtuple)
+
+from showmehow.model import (Effect, Lesson, SideEffect, Task)
+
+# Assign 'basestring' to str if running on Python 3
+try:
+    basestring
+except NameError:
+    basestring = str
+
+
+LEVELS = ("beginner", "intermediate", "advanced")
+
+# These must match the side effect types that showmehow can dispatch.
+SIDE_EFFECT_TYPES = ("event",)
+
+MATCHER_TYPES = ("exact", "normalized", "regex")
+
+# The result of an attempt which none of the matchers of a task match
+UNMATCHED_RESULT = "failure"
+
+
+Matcher = namedtuple("Matcher", "type pattern result")
+
+
+class LessonValidationError(Exception):
+    """Raised when lessons.json has mistakes in it.
+
+    The problems attribute lists every mistake that was found.
+    """
+
+    def __init__(self, problems):
+        """Initialise with the list of problems."""
+        super(LessonValidationError, self).__init__(
+            "Invalid lessons:\n" + "\n".join("  " + p for p in problems)
+        )
+        self.problems = problems
+
+
+def _validate_side_effects(where, side_effects, problems):
+    """Check the side effects of an effect."""
+    if not isinstance(side_effects, list):
+        problems.append("{}: side_effects must be a list".format(where))
+        return
+
+    for index, side_effect in enumerate(side_effects):
+        if side_effect.get("type") not in SIDE_EFFECT_TYPES:
+            problems.append("{}: side effect {} has unknown type {!r}".format(
+                where, index, side_effect.get("type")
+            ))
+        if "value" not in side_effect:
+            problems.append("{}: side effect {} has no value".format(where,
+                                                                     index))
+
+
+def _validate_matchers(where, task, problems):
+    """Check the local matchers of a task."""
+    matchers = task["matchers"]
+    if not isinstance(matchers, list) or not matchers:
+        problems.append("{}: matchers must be a non-empty list".format(where))
+        return
+
+    effects = task.get("effects", {})
+    if UNMATCHED_RESULT not in effects:
+        problems.append("{}: matchers need a {} effect".format(where,
+                                                               UNMATCHED_RESULT))
+
+    for index, matcher in enumerate(matchers):
+        matcher_where = "{}: matcher {}".format(where, index)
+        if matcher.get("type") not in MATCHER_TYPES:
+            problems.append("{} has unknown type {!r}".format(matcher_where,
+                                                              matcher.get("type")))
+        if matcher.get("result") not in effects:
+            problems.append("{} has unknown result {!r}".format(matcher_where,
+                                                                matcher.get("result")))
+        if "pattern" not in matcher:
+            problems.append("{} has no pattern".format(matcher_where))
+        elif matcher.get("type") == "regex":
+            try:
+                re.compile(matcher["pattern"])
+            except re.error as error:
+                problems.append("{} has an invalid pattern: {}".format(matcher_where,
+                                                                       error))
+
+
+def _validate_task(lesson_name, practice, task_id, task, problems):
+    """Check a task in practice and its effects."""
+    where = "{}/{}".format(lesson_name, task_id)
+    if "task" not in task:
+        problems.append("{}: missing task description".format(where))
+
+    effects = task.get("effects")
+    if not isinstance(effects, dict) or not effects:
+        problems.append("{}: missing effects".format(where))
+        return
+
+    for result, effect in effects.items():
+        effect_where = "{}[{}]".format(where, result)
+        if "reply" not in effect:
+            problems.append("{}: missing reply".format(effect_where))
+        if "move_to" in effect and effect["move_to"] not in practice:
+            problems.append("{}: move_to unknown task {!r}".format(effect_where,
+                                                                   effect["move_to"]))
+        _validate_side_effects(effect_where,
+                               effect.get("side_effects", list()),
+                               problems)
+
+    if "matchers" in task:
+        _validate_matchers(where, task, problems)
+
+    if not isinstance(task.get("deterministic", False), bool):
+        problems.append("{}: deterministic must be true or false".format(where))
+
+    vocabulary = task.get("vocabulary", [])
+    if (not isinstance(vocabulary, list) or
+        not all(isinstance(word, basestring) and word.split() == [word]
+                for word in vocabulary)):
+        problems.append("{}: vocabulary must be a list of words".format(where))
+
+
+def _successors(task):
+    """Get the tasks an attempt at task can move to, and whether it can complete."""
+    moves = set()
+    completes = False
+    for effect in task.get("effects", {}).values():
+        if effect.get("completes_lesson", False):
+            completes = True
+        elif "move_to" in effect:
+            moves.add(effect["move_to"])
+
+    return moves, completes
+
+
+def steps_to_completion(lesson):
+    """Get the smallest number of attempts from each task to completion.
+
+    Tasks which cannot reach completion are left out.
+    """
+    predecessors = defaultdict(set)
+    distances = {}
+    frontier = deque()
+
+    for task_id, task in lesson["practice"].items():
+        moves, completes = _successors(task)
+        for move in moves:
+            predecessors[move].add(task_id)
+        if completes:
+            distances[task_id] = 1
+            frontier.append(task_id)
+
+    while frontier:
+        task_id = frontier.popleft()
+        for predecessor in predecessors[task_id]:
+            if predecessor not in distances:
+                distances[predecessor] = distances[task_id] + 1
+                frontier.append(predecessor)
+
+    return distances
+
+
+def _reachable(lesson):
+    """Get the tasks reachable from the entry of lesson."""
+    reached = set([lesson["entry"]])
+    frontier = deque(reached)
+    while frontier:
+        moves, _ = _successors(lesson["practice"][frontier.popleft()])
+        for move in moves - reached:
+            if move in lesson["practice"]:
+                reached.add(move)
+                frontier.append(move)
+
+    return reached
+
+
+def validate_lessons(lessons):
+    """Check lessons, raising LessonValidationError if there are mistakes."""
+    problems = []
+    seen = set()
+
+    for index, lesson in enumerate(lessons):
+        name = lesson.get("name", "#{}".format(index))
+        for key in ("name", "desc", "entry", "level", "practice"):
+            if key not in lesson:
+                problems.append("{}: missing {}".format(name, key))
+        if name in seen:
+            problems.append("{}: duplicate lesson".format(name))
+        seen.add(name)
+
+        if "level" in lesson and lesson["level"] not in LEVELS:
+            problems.append("{}: unknown level {!r}".format(name, lesson["level"]))
+
+        practice = lesson.get("practice")
+        if not isinstance(practice, dict) or not practice:
+            continue
+
+        for task_id, task in practice.items():
+            _validate_task(name, practice, task_id, task, problems)
+
+        if lesson.get("entry") not in practice:
+            problems.append("{}: entry {!r} is not a task".format(name,
+                                                                  lesson.get("entry")))
+            continue
+
+        reachable = _reachable(lesson)
+        completing = steps_to_completion(lesson)
+        for task_id in sorted(reachable):
+            if task_id not in completing:
+                problems.append("{}/{}: lesson cannot be completed from here".format(name,
+                                                                                     task_id))
+        for task_id in sorted(set(practice) - reachable):
+            problems.append("{}/{}: not reachable from entry".format(name, task_id))
+
+    if problems:
+        raise LessonValidationError(problems)
+
+
+def normalize_input(text):
+    """Strip text and collapse runs of whitespace within it."""
+    return " ".join(text.split())
+
+
+def _compile_matcher(matcher):
+    """Compile a matcher descriptor into a Matcher."""
+    if matcher["type"] == "regex":
+        pattern = re.compile("(?:{})\\Z".format(matcher["pattern"]))
+    elif matcher["type"] == "normalized":
+        pattern = normalize_input(matcher["pattern"])
+    else:
+        pattern = matcher["pattern"]
+
+    return Matcher(matcher["type"], pattern, matcher["result"])
+
+
+def compile_matchers(lesson):
+    """Compile the local matchers of the tasks in lesson.
+
+    Returns a dict mapping each task which has matchers to a tuple
+    of Matchers, to be evaluated with evaluate_matchers.
+    """
+    return {
+        task_id: tuple(_compile_matcher(matcher) for matcher in task["matchers"])
+        for task_id, task in lesson["practice"].items()
+        if "matchers" in task
+    }
+
+
+def evaluate_matchers(matchers, text):
+    """Get the result of an attempt with text at a task with matchers."""
+    normalized = None
+    for matcher in matchers:
+        if matcher.type == "exact":
+            matched = text == matcher.pattern
+        elif matcher.type == "normalized":
+            if normalized is None:
+                normalized = normalize_input(text)
+            matched = normalized == matcher.pattern
+        else:
+            matched = matcher.pattern.match(text) is not None
+
+        if matched:
+            return matcher.result
+
+    return UNMATCHED_RESULT
+
+
+def compile_vocabularies(lesson):
+    """Get the words that the user might type at each task in lesson.
+
+    Returns a dict mapping each task to a sorted tuple of the words in
+    its vocabulary and in the patterns of its exact and normalized
+    matchers.
+    """
+    vocabularies = {}
+    for task_id, task in lesson["practice"].items():
+        words = set(task.get("vocabulary", ()))
+        for matcher in task.get("matchers", ()):
+            if matcher["type"] != "regex":
+                words.update(matcher["pattern"].split())
+        vocabularies[task_id] = tuple(sorted(words))
+
+    return vocabularies
+
+
+def _compile_effect(result, effect, task_id):
+    """Compile the effect of result at the task task_id into an Effect."""
+    return Effect(result,
+                  effect["reply"],
+                  effect.get("move_to", task_id),
+                  effect.get("completes_lesson", False),
+                  tuple(SideEffect(side_effect["type"], side_effect["value"])
+                        for side_effect in effect.get("side_effects", ())))
+
+
+def compile_tasks(lesson):
+    """Compile every task in lesson into a Task.
+
+    Returns a dict mapping each task id to its Task, with the defaults
+    of its effects filled in.
+    """
+    matchers = compile_matchers(lesson)
+    vocabularies = compile_vocabularies(lesson)
+    distances = steps_to_completion(lesson)
+    return {
+        task_id: Task(lesson["name"],
+                      task_id,
+                      task["task"],
+                      {
+                          result: _compile_effect(result, effect, task_id)
+                          for result, effect in task["effects"].items()
+                      },
+                      matchers.get(task_id, ()),
+                      vocabularies[task_id],
+                      distances[task_id],
+                      task.get("deterministic", False))
+        for task_id, task in lesson["practice"].items()
+    }
+
+
+def compile_lesson(lesson):
+    """Compile the descriptor of lesson, without its tasks, into a Lesson."""
+    return Lesson(lesson["name"],
+                  lesson["desc"],
+                  lesson["entry"],
+                  lesson["level"],
+                  tuple(lesson.get("available_to", ())),
+                  lesson.get("requires_session", False))
+
+
+def main(argv=None):
+    """Validate a lessons file and write its compiled cache."""
+    import argparse
+    import os
+
+    from showmehow.catalog import (cache_paths, compile_lessons, write_cache)
+
+    parser = argparse.ArgumentParser("Validate and compile lessons")
+    parser.add_argument("lessons",
+                        nargs="?",
+                        metavar="LESSONS_JSON",
+                        default=os.path.join(os.path.dirname(__file__),
+                                             "lessons.json"))
+    parser.add_argument("--output",
+                        metavar="CACHE_DIR",
+                        help="Directory to write the compiled cache to")
+    arguments = parser.parse_args(argv or sys.argv[1:])
+
+    try:
+        compiled = compile_lessons(arguments.lessons)
+    except LessonValidationError as error:
+        sys.stderr.write("{}\n".format(error))
+        return 1
+
+    output = arguments.output or cache_paths(arguments.lessons)[0]
+    if not write_cache(output, arguments.lessons, compiled):
+        sys.stderr.write("Could not write {}\n".format(output))
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
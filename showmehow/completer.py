@@ -0,0 +1,195 @@
+# /showmehow/completer.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - tab completion at the prompt
+"""Complete words at the showmehow prompt with readline.
+
+readline calls the completer for every press of TAB, on the thread
+which is reading the line, so it must answer from memory. Everything
+it needs is built into prefix tries ahead of time, on the main loop:
+the names of the unlocked tasks whenever the UnlockedTaskIndex changes,
+and the vocabulary of each task from the lesson catalog when the user
+gets to it. Completing a word only walks the trie, so it never calls
+out to D-Bus or GSettings.
+
+The first word on the line completes to the commands that showmehow
+understands itself and the vocabulary of the current task, the word
+after 'showmehow' to the names of unlocked tasks and any other word to
+the vocabulary of the current task.
+
+showmehow-client has no lesson catalog, so the daemon sends it the
+words to complete with each prompt, which it completes with a
+WordCompleter.
+"""
+
+# Words which showmehow handles itself, rather than submitting them
+COMMANDS = ("exit", "quit", "showmehow")
+
+# Only break words at whitespace and shell operators, so that options,
+# paths and schema names complete as a whole
+WORD_DELIMITERS = " \t\n\"'`|&;<>()"
+
+
+class PrefixTrie(object):
+    """A set of words which can be looked up by prefix.
+
+    The words are kept in sorted order, so every node in the trie only
+    has to record the range of words below it. Looking up a prefix is
+    a walk down the trie, one node per character, and a slice.
+    """
+
+    def __init__(self, words=()):
+        """Build the trie for words."""
+        super(PrefixTrie, self).__init__()
+
+        self._words = tuple(sorted(set(words)))
+        self._root = [{}, 0, len(self._words)]
+        for index, word in enumerate(self._words):
+            node = self._root
+            for character in word:
+                child = node[0].get(character)
+                if child is None:
+                    child = node[0][character] = [{}, index, index]
+                child[2] = index + 1
+                node = child
+
+    def __iter__(self):
+        """Iterate over the words in sorted order."""
+        return iter(self._words)
+
+    def __len__(self):
+        """Return the number of words."""
+        return len(self._words)
+
+    def complete(self, prefix):
+        """Get the words starting with prefix, in sorted order."""
+        node = self._root
+        for character in prefix:
+            node = node[0].get(character)
+            if node is None:
+                return ()
+
+        return self._words[node[1]:node[2]]
+
+
+class _Completer(object):
+    """Base for readline completers for the showmehow prompt.
+
+    _current is the pair of tries for the vocabulary of the current
+    task, and for the commands and that vocabulary together.
+    Subclasses say which task names to complete in _task_names.
+    """
+
+    def __init__(self):
+        """Initialise with no vocabulary."""
+        super(_Completer, self).__init__()
+
+        self._current = (PrefixTrie(), PrefixTrie(COMMANDS))
+        self._matches = ()
+
+    def _task_names(self):
+        """Get the PrefixTrie of task names to complete."""
+        raise NotImplementedError()
+
+    def matches(self, line, begin, text):
+        """Get the completions of text, which starts at begin in line."""
+        vocabulary, first_words = self._current
+        preceding = line[:begin].split()
+        if not preceding:
+            return first_words.complete(text)
+        elif preceding == ["showmehow"]:
+            return self._task_names().complete(text)
+
+        return vocabulary.complete(text)
+
+    def complete(self, text, state):
+        """Get completion number state of text, for readline.set_completer."""
+        import readline
+
+        if state == 0:
+            self._matches = self.matches(readline.get_line_buffer(),
+                                         readline.get_begidx(),
+                                         text)
+
+        try:
+            return self._matches[state]
+        except IndexError:
+            return None
+
+
+class PromptCompleter(_Completer):
+    """readline completer for the showmehow prompt.
+
+    Call move_to() with each task that the user gets to, from the main
+    loop. The unlocked task names come from the completions attribute
+    of unlocked_tasks, which the index keeps up to date.
+    """
+
+    def __init__(self, lessons, unlocked_tasks):
+        """Initialise with the lesson catalog and the UnlockedTaskIndex."""
+        super(PromptCompleter, self).__init__()
+
+        self._lessons = lessons
+        self._unlocked_tasks = unlocked_tasks
+        self._tries = {}
+
+    def _task_names(self):
+        """Get the PrefixTrie of unlocked task names."""
+        return self._unlocked_tasks.completions
+
+    def move_to(self, lesson, task):
+        """Complete the vocabulary of task in lesson from now on."""
+        try:
+            tries = self._tries[(lesson, task)]
+        except KeyError:
+            words = self._lessons.vocabulary(lesson, task)
+            tries = self._tries[(lesson, task)] = (PrefixTrie(words),
+                                                   PrefixTrie(COMMANDS + words))
+
+        # Swap both in at once, since completion happens on another thread
+        self._current = tries
+
+    def forget(self, lessons):
+        """Throw away the vocabulary of the tasks in lessons, which changed.
+
+        The current task keeps its old vocabulary until move_to() is
+        called again.
+        """
+        for key in [key for key in self._tries if key[0] in lessons]:
+            del self._tries[key]
+
+    def words(self):
+        """Get the vocabulary of the current task and the unlocked task names.
+
+        These are what a WordCompleter needs to complete the same words.
+        """
+        vocabulary, _ = self._current
+        return list(vocabulary), list(self._unlocked_tasks.completions)
+
+
+class WordCompleter(_Completer):
+    """readline completer for words given by the showmehow daemon.
+
+    Call update() with the words from PromptCompleter.words() before
+    each prompt.
+    """
+
+    def __init__(self):
+        """Initialise with no words."""
+        super(WordCompleter, self).__init__()
+
+        self._tasks = PrefixTrie()
+
+    def _task_names(self):
+        """Get the PrefixTrie of task names."""
+        return self._tasks
+
+    def update(self, vocabulary, task_names):
+        """Complete vocabulary and task_names from now on."""
+        vocabulary = tuple(vocabulary)
+        if task_names != list(self._tasks):
+            self._tasks = PrefixTrie(task_names)
+        if vocabulary != tuple(self._current[0]):
+            self._current = (PrefixTrie(vocabulary),
+                             PrefixTrie(COMMANDS + vocabulary))
@@ -0,0 +1,102 @@
+# /showmehow/completion.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - tab completion fast path
+"""Fast path for tab-completing task names.
+
+Bash completion runs this on every press of TAB, so it must not import
+GLib, talk to D-Bus or parse lessons.json if it can avoid it. Instead it
+prints a small cached list of the names of unlocked lessons. showmehow
+rewrites that list whenever it reads the unlocked-lessons key, and the
+list is considered stale once the dconf database backing GSettings or
+lessons.json have changed since it was written.
+"""
+
+import os
+import sys
+
+from showmehow.paths import (dconf_user_database,
+                             user_cache_dir,
+                             write_atomically)
+
+
+LESSONS_PATH = os.path.join(os.path.dirname(__file__), "lessons.json")
+
+
+def unlocked_names_cache_path():
+    """Get the path to the cached list of unlocked lesson names."""
+    return os.path.join(user_cache_dir(), "unlocked-lessons")
+
+
+def _mtime(path):
+    """Get the modification time of path, or 0 if it does not exist."""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0
+
+
+def read_unlocked_names():
+    """Read the cached unlocked lesson names.
+
+    Returns None if there is no cache or it is stale.
+    """
+    cache_path = unlocked_names_cache_path()
+    try:
+        cache_mtime = os.stat(cache_path).st_mtime
+    except OSError:
+        return None
+
+    if cache_mtime < max(_mtime(dconf_user_database()), _mtime(LESSONS_PATH)):
+        return None
+
+    with open(cache_path) as cache_stream:
+        return cache_stream.read().split()
+
+
+def write_names(path, names):
+    """Atomically replace the list of names at path.
+
+    Returns True if the list was written.
+    """
+    return write_atomically(path, "".join(name + "\n" for name in names))
+
+
+def write_unlocked_names(names):
+    """Atomically replace the cached unlocked lesson names with names."""
+    # If this fails, completion will just take the slow path next time.
+    write_names(unlocked_names_cache_path(), names)
+
+
+def _unlocked_names_from_settings():
+    """Read unlocked lesson names from GSettings and the lesson catalog.
+
+    This is the slow path, only taken when the cache is stale, so GLib
+    and the catalog are only imported here.
+    """
+    from showmehow.catalog import load_catalog
+    from showmehow.lazy import Gio
+
+    catalog = load_catalog(LESSONS_PATH)
+    settings = Gio.Settings.new("com.endlessm.showmehow")
+    return [
+        name for name in settings.get_value("unlocked-lessons")
+        if name in catalog
+    ]
+
+
+def main(argv=None):
+    """Print the names of unlocked lessons, one per line."""
+    del argv
+
+    names = read_unlocked_names()
+    if names is None:
+        names = _unlocked_names_from_settings()
+        write_unlocked_names(names)
+
+    sys.stdout.write("".join(name + "\n" for name in names))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+# /showmehow/daemon.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - daemon hosting many sessions
+"""A long-running showmehow which hosts sessions for thin clients.
+
+Every showmehow process imports GI, loads the lesson catalog and
+constructs its own service proxies before it can show anything. The
+daemon does that once and then runs a PracticeTaskStateMachine for each
+client which connects to its Unix socket, all on one main loop, sharing
+the catalog, the unlocked task index and the proxies. Each state machine
+still has sessions with the service of its own. When the lessons change,
+the shared catalog is reloaded in place and every session carries on.
+
+Clients and the daemon exchange JSON objects, one per line. The client
+starts with:
+
+    {"start": true, "task": TASK, "colour": BOOL, "width": COLUMNS,
+     "restart": BOOL, "attempt_timeout": SECS, "attempt_retries": N}
+
+where the last three are the options of showmehow, and may be left
+out. The daemon then sends what the client should do, as any of:
+
+    {"banner": true}                    show the first run banner
+    {"write": TEXT, "newline": BOOL}    type out TEXT
+    {"dots": COUNT, "interval": SECS}   type out COUNT dots
+    {"show": TEXT}                      write TEXT straight away
+    {"prompt": PROMPT,                  read a line and reply with
+     "vocabulary": WORDS,               {"line": LINE}, or null at EOF,
+     "tasks": NAMES}                    completing WORDS and task NAMES
+    {"exit": STATUS}                    the session is over
+
+so text is typed out by the client and the daemon never sleeps. When
+the user presses Ctrl-C, the client sends {"cancel": true}, which
+cancels the attempt being checked, or ends the session if there is
+none, as it would in showmehow.
+"""
+
+import errno
+import json
+import os
+import socket
+import stat
+import sys
+
+from showmehow.completer import PromptCompleter
+from showmehow.known import forget_known_tasks
+from showmehow.lazy import GLib
+from showmehow.paths import daemon_socket_path
+from showmehow.showmehow import (ATTEMPT_CACHE,
+                                 DEFAULT_ATTEMPT_POLICY,
+                                 PracticeTaskStateMachine,
+                                 ServiceProxiesLoader,
+                                 UnlockedTaskIndex,
+                                 find_task_or_report_error,
+                                 load_lessons,
+                                 pick_up_task,
+                                 reload_lessons)
+from showmehow.typewriter import using_typewriter
+
+
+class RemoteTypewriter(object):
+    """Typewriter which has a client type out the text instead."""
+
+    def __init__(self, connection, colour, width):
+        """Initialise with the connection to the client."""
+        super(RemoteTypewriter, self).__init__()
+        self._connection = connection
+        self.colour = colour
+        self.width = width
+
+    def show(self, text):
+        """Have the client write text and a newline straight away."""
+        self._connection.send({"show": text})
+
+    def write(self, text, newline=True):
+        """Have the client type out text."""
+        self._connection.send({"write": text, "newline": newline})
+
+    def dots(self, count, interval=1):
+        """Have the client type out count dots."""
+        self._connection.send({"dots": count, "interval": interval})
+
+
+class ClientConnection(object):
+    """A connection to a client, which is also the input source of its session.
+
+    Lines are read from the client by sending it a prompt and waiting
+    for the line to come back. If the client goes away, the session
+    gets the end of input. The socket does not block: messages for the
+    client are queued and written as it reads them, so that a client
+    which stops reading does not hold up the sessions of the others.
+    """
+
+    def __init__(self, daemon, client_socket):
+        """Initialise with the daemon and the socket for the client."""
+        super(ClientConnection, self).__init__()
+
+        self._daemon = daemon
+        self._socket = client_socket
+        self._socket.setblocking(False)
+        self._buffer = b""
+        self._output = b""
+        self._write_id = None
+        self._finished = False
+        self._callback = None
+        self._completer = None
+        self._machine = None
+        self._started = False
+        self._hung_up = False
+        self._watch_id = GLib.io_add_watch(client_socket.fileno(),
+                                           GLib.PRIORITY_DEFAULT,
+                                           GLib.IO_IN | GLib.IO_HUP,
+                                           self._on_readable)
+
+    def send(self, message):
+        """Queue message for the client, unless it has gone away."""
+        if self._hung_up:
+            return
+
+        self._output += (json.dumps(message) + "\n").encode("utf-8")
+        if self._write_id is None:
+            self._flush()
+
+    def _flush(self):
+        """Write as much of the queued output as the client can take.
+
+        Whatever is left is written once the socket is writable again.
+        """
+        while self._output and not self._hung_up:
+            try:
+                sent = self._socket.send(self._output)
+            except socket.error as error:
+                if error.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    self._hang_up()
+                break
+
+            self._output = self._output[sent:]
+
+        if self._output and self._write_id is None:
+            self._write_id = GLib.io_add_watch(self._socket.fileno(),
+                                               GLib.PRIORITY_DEFAULT,
+                                               GLib.IO_OUT,
+                                               self._on_writable)
+
+    def _on_writable(self, *args):
+        """Write more of the queued output, closing once it is all written."""
+        del args
+
+        # _flush adds the watch again if there is still more to write
+        self._write_id = None
+        self._flush()
+        if self._finished and self._write_id is None:
+            self._close()
+        return False
+
+    def _hang_up(self):
+        """Note that the client has gone away, ending the input."""
+        self._hung_up = True
+        self._output = b""
+        if self._write_id is not None:
+            GLib.source_remove(self._write_id)
+            self._write_id = None
+        self._deliver(None)
+
+    def _deliver(self, line):
+        """Pass line to the waiting callback, if there is one."""
+        callback, self._callback = self._callback, None
+        if callback is not None:
+            callback(line)
+
+    def _deliver_end_of_input(self, callback):
+        """Pass the end of input to callback."""
+        callback(None)
+        return False
+
+    def _on_readable(self, *args):
+        """Read what is available and handle any complete messages."""
+        del args
+
+        try:
+            chunk = self._socket.recv(4096)
+        except socket.error as error:
+            if error.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return True
+            chunk = b""
+
+        if not chunk:
+            self._watch_id = None
+            self._hang_up()
+            return False
+
+        self._buffer += chunk
+        while b"\n" in self._buffer:
+            line, self._buffer = self._buffer.split(b"\n", 1)
+            try:
+                message = json.loads(line.decode("utf-8"))
+            except ValueError:
+                continue
+
+            if message.get("start") and not self._started:
+                self._started = True
+                self._daemon.start_session(self, message)
+            elif "line" in message:
+                self._deliver(message["line"])
+            elif message.get("cancel") and self._machine is not None:
+                self._machine.interrupt()
+
+        return True
+
+    def set_completer(self, completer):
+        """Have the client complete the words that completer would."""
+        self._completer = completer
+
+    def set_machine(self, machine):
+        """Have Ctrl-C on the client interrupt machine."""
+        self._machine = machine
+
+    def read_line(self, prompt, callback):
+        """Have the client show prompt and pass the line it reads to callback.
+
+        The line is None if the client reached the end of input or
+        went away.
+        """
+        if self._hung_up:
+            GLib.idle_add(self._deliver_end_of_input, callback)
+            return
+
+        message = {"prompt": prompt}
+        if self._completer is not None:
+            message["vocabulary"], message["tasks"] = self._completer.words()
+
+        self._callback = callback
+        self.send(message)
+
+    def cancel(self):
+        """Drop the line for any outstanding request."""
+        self._callback = None
+
+    def close(self):
+        """Do nothing, the daemon closes the connection once the session ends."""
+        pass
+
+    def finish(self, status):
+        """Tell the client that the session is over and close the connection.
+
+        The connection is closed once the client has been sent
+        everything queued for it, or has gone away.
+        """
+        self._finished = True
+        self.send({"exit": status})
+        if self._write_id is None:
+            self._close()
+
+    def _close(self):
+        """Stop watching the socket and close it."""
+        if self._watch_id is not None:
+            GLib.source_remove(self._watch_id)
+            self._watch_id = None
+        self._socket.close()
+
+
+class Daemon(object):
+    """Accept clients on a Unix socket and run a session for each of them."""
+
+    def __init__(self, socket_path):
+        """Load everything that sessions share and start listening."""
+        super(Daemon, self).__init__()
+
+        proxies = ServiceProxiesLoader()
+        self._lessons = load_lessons()
+        self._unlocked_tasks = UnlockedTaskIndex(self._lessons)
+        self._service, self._coding_game_service = proxies.wait()
+        self._service.connect("lessons-changed", self._on_lessons_changed)
+
+        self._loop = GLib.MainLoop()
+        self._socket_path = socket_path
+        self._socket = _listen(socket_path)
+        GLib.io_add_watch(self._socket.fileno(),
+                          GLib.PRIORITY_DEFAULT,
+                          GLib.IO_IN,
+                          self._on_client_connected)
+
+    def _on_lessons_changed(self, *args):
+        """Load the lessons again, in place, so that sessions carry on.
+
+        Sessions share the lessons, so they are loaded once here, and
+        each session is updated as they are reloaded. If they cannot be
+        loaded, sessions carry on with the lessons as they were.
+        """
+        del args
+
+        # What the user has completed may have changed too, and so may
+        # the results of attempts
+        forget_known_tasks()
+        ATTEMPT_CACHE.clear()
+        reload_lessons(self._lessons)
+
+    def _on_client_connected(self, *args):
+        """Accept a client."""
+        del args
+
+        try:
+            client_socket, _ = self._socket.accept()
+        except socket.error:
+            return True
+
+        ClientConnection(self, client_socket)
+        return True
+
+    def start_session(self, connection, message):
+        """Start a session for the client on connection."""
+        typewriter = RemoteTypewriter(connection,
+                                      bool(message.get("colour", False)),
+                                      message.get("width") or None)
+        with using_typewriter(typewriter):
+            # Only show the banner when showmehow is actually useful
+            if len(self._unlocked_tasks) != 0:
+                connection.send({"banner": True})
+
+            task, entry = find_task_or_report_error(self._unlocked_tasks,
+                                                    message.get("task"))
+            if task and entry and not message.get("restart"):
+                entry = pick_up_task(self._lessons, task, entry)
+        if not task or not entry:
+            connection.finish(0)
+            return
+
+        policy = DEFAULT_ATTEMPT_POLICY
+        if message.get("attempt_timeout") is not None:
+            policy = policy._replace(timeout=float(message["attempt_timeout"]))
+        if message.get("attempt_retries") is not None:
+            policy = policy._replace(retries=max(int(message["attempt_retries"]), 0))
+
+        completer = PromptCompleter(self._lessons, self._unlocked_tasks)
+        connection.set_completer(completer)
+        machine = PracticeTaskStateMachine(
+            self._service,
+            self._coding_game_service,
+            self._lessons,
+            task,
+            entry,
+            input_source=connection,
+            unlocked_tasks=self._unlocked_tasks,
+            on_finished=lambda machine: GLib.idle_add(self._end_session,
+                                                      connection,
+                                                      machine),
+            typewriter=typewriter,
+            checkpoint=True,
+            attempt_policy=policy,
+            completer=completer,
+            owns_lessons=False
+        )
+        connection.set_machine(machine)
+        machine.begin()
+
+    def _end_session(self, connection, machine):
+        """Close the state machine for a session and let its client go."""
+        connection.set_machine(None)
+        machine.close()
+        connection.finish(0)
+        return False
+
+    def run(self):
+        """Serve clients until interrupted."""
+        try:
+            self._loop.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._socket.close()
+            os.unlink(self._socket_path)
+
+
+def _listen(socket_path):
+    """Listen on a Unix socket at socket_path, only accessible to this user.
+
+    Raises RuntimeError if another daemon is already listening there.
+    """
+    try:
+        os.makedirs(os.path.dirname(socket_path), 0o700)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise error
+
+    if os.path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+        except socket.error:
+            # Left behind by a daemon which did not exit cleanly
+            os.unlink(socket_path)
+        else:
+            raise RuntimeError("showmehow daemon already running at {}".format(socket_path))
+        finally:
+            probe.close()
+
+    server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server_socket.bind(socket_path)
+    os.chmod(socket_path, stat.S_IRUSR | stat.S_IWUSR)
+    server_socket.listen(16)
+    return server_socket
+
+
+def main(argv=None):
+    """Entry point for the showmehow daemon."""
+    import argparse
+
+    parser = argparse.ArgumentParser("showmehow-daemon - Host showmehow sessions")
+    parser.add_argument("--socket",
+                        metavar="PATH",
+                        default=daemon_socket_path(),
+                        help="Where to listen for clients")
+    arguments = parser.parse_args(argv or sys.argv[1:])
+
+    try:
+        daemon = Daemon(arguments.socket)
+    except RuntimeError as error:
+        sys.stderr.write("{}\n".format(error))
+        return 1
+
+    daemon.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# /showmehow/known.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - cache of completed lessons
+"""Cache of the lessons which the user has completed.
+
+remindmehow lists the lessons that the user has already done, which
+used to mean a blocking round trip to the service every time it ran,
+activating the service first if it was not running. Instead, the names
+are cached on disk. The cache is filled from the service the first
+time it is needed and showmehow adds each lesson to it as it is
+completed. When the service says that lessons have changed, the cache
+is thrown away, so that it is filled from the service again. Lessons
+can also be completed without showmehow hearing about it, so the cache
+is only trusted for _KNOWN_TASKS_MAX_AGE after it was filled.
+"""
+
+import os
+import time
+
+from showmehow.completion import write_names
+from showmehow.paths import user_cache_dir
+
+# How long the cached names are trusted for after they were filled from
+# the service, in seconds
+_KNOWN_TASKS_MAX_AGE = 24 * 60 * 60
+
+
+def known_tasks_cache_path():
+    """Get the path to the cached list of completed lesson names."""
+    return os.path.join(user_cache_dir(), "known-tasks")
+
+
+def _known_tasks_filled_at():
+    """Get when the cache was filled from the service, or None if there is none."""
+    try:
+        return os.stat(known_tasks_cache_path()).st_mtime
+    except OSError:
+        return None
+
+
+def read_known_tasks():
+    """Read the cached completed lesson names.
+
+    Returns None if there is no cache or it is too old to be trusted.
+    """
+    filled_at = _known_tasks_filled_at()
+    if filled_at is None or time.time() - filled_at > _KNOWN_TASKS_MAX_AGE:
+        return None
+
+    try:
+        with open(known_tasks_cache_path()) as cache_stream:
+            return cache_stream.read().split()
+    except (IOError, OSError):
+        return None
+
+
+def write_known_tasks(names):
+    """Atomically replace the cached completed lesson names with names."""
+    write_names(known_tasks_cache_path(), names)
+
+
+def add_known_task(name):
+    """Add name to the cached completed lesson names.
+
+    If there is no cache, nothing is written, since the cache would
+    then be missing the lessons which only the service knows about. The
+    cache keeps the time it was filled, so it does not look fresher than
+    it is.
+    """
+    filled_at = _known_tasks_filled_at()
+    names = read_known_tasks()
+    if names is not None and name not in names:
+        write_known_tasks(names + [name])
+        os.utime(known_tasks_cache_path(), (filled_at, filled_at))
+
+
+def forget_known_tasks():
+    """Throw the cached completed lesson names away."""
+    try:
+        os.unlink(known_tasks_cache_path())
+    except OSError:
+        pass
@@ -0,0 +1,53 @@
+# /showmehow/lazy.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - lazily imported modules
+"""Lazily imported GObject-Introspection modules.
+
+Importing PyGObject and loading typelibs accounts for most of the cold
+start time of showmehow, but --help, --list and NONINTERACTIVE runs
+need little or none of it. The stand-ins here only import their
+gi.repository module on first attribute access.
+"""
+
+import importlib
+import time
+
+from showmehow.profiling import STARTUP
+
+
+class LazyRepository(object):
+    """Stand-in for a gi.repository module, imported on first use."""
+
+    def __init__(self, namespace, version):
+        """Initialise with the namespace and version to require."""
+        super(LazyRepository, self).__init__()
+        self._namespace = namespace
+        self._version = version
+        self._module = None
+
+    def load(self):
+        """Import the underlying module, if necessary, and return it."""
+        if self._module is None:
+            start = time.time()
+
+            import gi
+            gi.require_version(self._namespace, self._version)
+            self._module = importlib.import_module("gi.repository." +
+                                                   self._namespace)
+
+            STARTUP.record("gi.repository." + self._namespace,
+                           time.time() - start)
+
+        return self._module
+
+    def __getattr__(self, name):
+        """Look up name on the underlying module."""
+        return getattr(self.load(), name)
+
+
+CodingGameService = LazyRepository("CodingGameService", "1.0")
+GLib = LazyRepository("GLib", "2.0")
+Gio = LazyRepository("Gio", "2.0")
+Showmehow = LazyRepository("Showmehow", "1.0")
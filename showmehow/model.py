@@ -0,0 +1,119 @@
+# /showmehow/model.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - compiled lessons, tasks and effects
+"""Compact objects for lessons, tasks, their effects and side effects.
+
+These are what the compiler turns lessons.json into and what the lesson
+catalog hands out. Nested dicts from json.load cost a lot of memory per
+task and a hash lookup for every field, so these use __slots__ instead.
+Identifiers, such as lesson and task names and effect results, are
+interned, so that the many copies of them share memory and compare by
+identity first. They are pickled as a plain tuple of their fields, and
+identifiers are interned again when they are unpickled from the cache.
+"""
+
+# Assign 'intern' to sys.intern if running on Python 3
+try:
+    intern
+except NameError:
+    from sys import intern
+
+
+def _intern(text):
+    """Intern text, if it can be interned."""
+    try:
+        return intern(text)
+    except TypeError:
+        # Only str can be interned on Python 2, not unicode
+        return text
+
+
+class _Compact(object):
+    """Base for objects whose fields are all slots.
+
+    The fields named in _INTERNED are identifiers which get interned.
+    """
+
+    __slots__ = ()
+    _INTERNED = ()
+
+    def __init__(self, *values):
+        """Initialise the fields, in the order of __slots__."""
+        super(_Compact, self).__init__()
+        self.__setstate__(values)
+
+    def __getstate__(self):
+        """Get the fields as a tuple, for pickling."""
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        """Set the fields from a tuple, interning identifiers."""
+        for slot, value in zip(self.__slots__, state):
+            if slot in self._INTERNED and value is not None:
+                value = _intern(value)
+            setattr(self, slot, value)
+
+    def __eq__(self, other):
+        """Return True if other has the same type and fields."""
+        return (type(self) is type(other) and
+                self.__getstate__() == other.__getstate__())
+
+    def __ne__(self, other):
+        """Return True if other has a different type or fields."""
+        return not self == other
+
+    def __hash__(self):
+        """Hash the fields."""
+        return hash(self.__getstate__())
+
+    def __repr__(self):
+        """Show the fields."""
+        return "{}({})".format(type(self).__name__,
+                               ", ".join(repr(value)
+                                         for value in self.__getstate__()))
+
+
+class SideEffect(_Compact):
+    """Something to tell coding-game-service, such as an event."""
+
+    __slots__ = ("type", "value")
+    _INTERNED = ("type",)
+
+
+class Effect(_Compact):
+    """What happens when an attempt at a task gets result.
+
+    The reply is shown, then the lesson moves to the task move_to,
+    which is the same task if the user has to try again, or is
+    complete if completes_lesson is True. side_effects is a tuple
+    of SideEffects to dispatch.
+    """
+
+    __slots__ = ("result", "reply", "move_to", "completes_lesson", "side_effects")
+    _INTERNED = ("result", "move_to")
+
+
+class Task(_Compact):
+    """A task in a lesson.
+
+    effects maps each result to its Effect. matchers is a tuple of
+    Matchers if attempts are checked in-process, or empty otherwise.
+    vocabulary is a sorted tuple of words the user might type and
+    steps is the smallest number of attempts to complete the lesson.
+    If deterministic is True, the service always gives the same
+    result for the same input, so results can be reused.
+    """
+
+    __slots__ = ("lesson", "id", "description", "effects", "matchers",
+                 "vocabulary", "steps", "deterministic")
+    _INTERNED = ("lesson", "id")
+
+
+class Lesson(_Compact):
+    """A lesson, without its tasks."""
+
+    __slots__ = ("name", "desc", "entry", "level", "available_to",
+                 "requires_session")
+    _INTERNED = ("name", "entry", "level")
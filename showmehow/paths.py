@@ -0,0 +1,93 @@
+# /showmehow/paths.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - per-user directories
+"""Per-user directories used by showmehow.
+
+These intentionally do not use GLib, so that they can be used from
+code paths that should not pay for importing it.
+"""
+
+import errno
+import os
+
+
+def _xdg_dir(variable, fallback):
+    """Get the XDG base directory named by variable."""
+    return (os.environ.get(variable) or
+            os.path.join(os.path.expanduser("~"), fallback))
+
+
+def user_cache_dir():
+    """Get the per-user cache directory for showmehow."""
+    return os.path.join(_xdg_dir("XDG_CACHE_HOME", ".cache"),
+                        "com.endlessm.Showmehow")
+
+
+def user_config_dir():
+    """Get the per-user configuration directory for showmehow."""
+    return os.path.join(_xdg_dir("XDG_CONFIG_HOME", ".config"),
+                        "com.endlessm.Showmehow")
+
+
+def user_runtime_dir():
+    """Get the per-user runtime directory for showmehow.
+
+    Inside a flatpak, every instance of the app gets a private
+    XDG_RUNTIME_DIR except for the app directory in it, so use that.
+    If there is no XDG_RUNTIME_DIR, fall back to the cache directory.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_dir:
+        return user_cache_dir()
+
+    flatpak_id = os.environ.get("FLATPAK_ID")
+    if flatpak_id:
+        return os.path.join(runtime_dir, "app", flatpak_id)
+
+    return os.path.join(runtime_dir, "com.endlessm.Showmehow")
+
+
+def daemon_socket_path():
+    """Get the path to the socket which the showmehow daemon listens on."""
+    return os.path.join(user_runtime_dir(), "daemon.sock")
+
+
+def dconf_user_database():
+    """Get the path to the dconf database backing GSettings.
+
+    Inside the flatpak, XDG_CONFIG_HOME is private to the app, so dconf
+    is pointed at the database of the host with DCONF_USER_CONFIG_DIR,
+    relative to the home directory.
+    """
+    config_dir = os.environ.get("DCONF_USER_CONFIG_DIR")
+    if config_dir:
+        return os.path.join(os.path.expanduser("~"), config_dir, "user")
+
+    return os.path.join(_xdg_dir("XDG_CONFIG_HOME", ".config"),
+                        "dconf", "user")
+
+
+def write_atomically(path, contents):
+    """Replace the file at path with contents, all at once.
+
+    The directory containing path is created if needed. Returns True if
+    the file was written.
+    """
+    temporary_path = "{}.{}".format(path, os.getpid())
+
+    try:
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise error
+
+        with open(temporary_path, "w") as stream:
+            stream.write(contents)
+        os.rename(temporary_path, path)
+    except (IOError, OSError):
+        return False
+
+    return True
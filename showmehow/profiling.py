@@ -0,0 +1,80 @@
+# /showmehow/profiling.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - startup profiling
+"""Per-phase timing of showmehow startup.
+
+Set SHOWMEHOW_PROFILE_STARTUP=1 or pass --profile-startup to have the
+time spent in each phase of startup written to stderr once showmehow
+is ready for input (or exits, whichever comes first).
+"""
+
+import atexit
+import os
+import sys
+import time
+
+
+_PROCESS_START = time.time()
+
+
+class StartupProfile(object):
+    """Record how long each phase of startup takes.
+
+    Phases are recorded back to back with mark(), so that together they
+    cover all the time since this module was imported. Imports which
+    happen lazily in the middle of a phase are recorded separately with
+    record().
+    """
+
+    def __init__(self):
+        """Initialise, enabling the profile from the environment."""
+        super(StartupProfile, self).__init__()
+        self._phases = []
+        self._imports = []
+        self._last_mark = _PROCESS_START
+        self._reported = False
+        self.enabled = False
+
+        if os.environ.get("SHOWMEHOW_PROFILE_STARTUP"):
+            self.enable()
+
+    def enable(self):
+        """Enable profiling and report on exit if not reported before."""
+        if not self.enabled:
+            self.enabled = True
+            atexit.register(self.finish)
+
+    def mark(self, phase):
+        """Record that phase finished just now."""
+        if self._reported:
+            return
+
+        now = time.time()
+        self._phases.append((phase, now - self._last_mark))
+        self._last_mark = now
+
+    def record(self, name, duration):
+        """Record a lazy import called name which took duration."""
+        self._imports.append((name, duration))
+
+    def finish(self, stream=None):
+        """Write the profile to stream, once."""
+        if not self.enabled or self._reported:
+            return
+
+        self._reported = True
+        stream = stream or sys.stderr
+        stream.write("Startup profile (ms):\n")
+        for phase, duration in self._phases:
+            stream.write("  {:<40} {:8.2f}\n".format(phase, duration * 1000))
+        for name, duration in self._imports:
+            stream.write("  {:<40} {:8.2f}\n".format("(lazy) " + name,
+                                                      duration * 1000))
+        stream.write("  {:<40} {:8.2f}\n".format("total",
+                                                  (time.time() - _PROCESS_START) * 1000))
+        stream.flush()
+
+
+STARTUP = StartupProfile()
@@ -0,0 +1,277 @@
+# /showmehow/prompt.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - non-blocking line input
+"""Read lines of input without blocking the main loop.
+
+Calling input() from inside a main loop callback stops the loop until
+the user presses enter, so no D-Bus signals or asynchronous replies are
+handled while the prompt is up. The input sources here read lines in
+the background instead and hand each one to a callback on the main loop.
+"""
+
+import os
+import sys
+import threading
+import time
+
+from collections import deque
+
+from showmehow.lazy import GLib
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Assign 'input' to raw_input if running on Python 2
+try:
+    input = raw_input
+except NameError:
+    pass
+
+
+_READLINE_CONFIGURED = False
+
+
+def configure_readline():
+    """Import and configure readline, the first time it is needed.
+
+    Importing readline is not free, and most ways of running showmehow
+    never read any input, so don't do it until there is a prompt.
+    """
+    global _READLINE_CONFIGURED  # pylint: disable=global-statement
+
+    if not _READLINE_CONFIGURED:
+        import readline
+        from showmehow.completer import WORD_DELIMITERS
+        readline.parse_and_bind("tab: complete")
+        readline.set_completer_delims(WORD_DELIMITERS)
+        _READLINE_CONFIGURED = True
+
+
+class ThreadedInputSource(object):
+    """Read lines from a terminal with readline on a helper thread.
+
+    Python does not expose the readline callback interface, so the only
+    way to keep line editing and history is to call input(). That
+    happens on a helper thread, which hands each line back to the main
+    loop with GLib.idle_add. The terminal settings are saved up front
+    and restored by close(), since the helper thread might be stopped
+    halfway through reading a line.
+
+    If completer is given, its complete method is used to complete
+    words when the user presses TAB.
+    """
+
+    def __init__(self, completer=None):
+        """Start the helper thread."""
+        super(ThreadedInputSource, self).__init__()
+
+        configure_readline()
+        if completer is not None:
+            import readline
+            readline.set_completer(completer.complete)
+
+        self._requests = queue.Queue()
+        self._generation = 0
+        self._terminal_attributes = None
+
+        try:
+            import termios
+            self._terminal_attributes = termios.tcgetattr(sys.stdin.fileno())
+        except (ImportError, EnvironmentError):
+            pass
+
+        thread = threading.Thread(target=self._read_lines)
+        thread.daemon = True
+        thread.start()
+
+    def _read_lines(self):
+        """Read a line for each request, on the helper thread."""
+        while True:
+            generation, prompt, callback = self._requests.get()
+            try:
+                line = input(prompt)
+            except EOFError:
+                line = None
+
+            GLib.idle_add(self._deliver, generation, callback, line)
+
+    def _deliver(self, generation, callback, line):
+        """Pass line to callback on the main loop, unless cancelled."""
+        if generation == self._generation:
+            callback(line)
+
+        return False
+
+    def read_line(self, prompt, callback):
+        """Show prompt and call callback with the line that was entered.
+
+        The line is None if the end of input was reached.
+        """
+        self._requests.put((self._generation, prompt, callback))
+
+    def cancel(self):
+        """Drop the line for any outstanding request."""
+        self._generation += 1
+
+    def close(self):
+        """Restore the terminal settings."""
+        if self._terminal_attributes is not None:
+            import termios
+            termios.tcsetattr(sys.stdin.fileno(),
+                              termios.TCSADRAIN,
+                              self._terminal_attributes)
+
+
+class WatchedInputSource(object):
+    """Read lines from a pipe or file with a GLib IO watch.
+
+    There is no line editing to preserve when input is not a terminal,
+    so this just reads whatever is available whenever the main loop
+    reports that the file descriptor is readable.
+    """
+
+    def __init__(self, fd=None):
+        """Initialise with the file descriptor to read from."""
+        super(WatchedInputSource, self).__init__()
+
+        self._fd = sys.stdin.fileno() if fd is None else fd
+        self._buffer = b""
+        self._eof = False
+        self._callback = None
+        self._watch_id = None
+
+    def _on_readable(self, *args):
+        """Read what is available and deliver a line if there is one."""
+        del args
+
+        chunk = os.read(self._fd, 4096)
+        if not chunk:
+            self._eof = True
+        self._buffer += chunk
+
+        self._deliver()
+        if self._callback is None or self._eof:
+            self._watch_id = None
+            return False
+
+        return True
+
+    def _deliver(self):
+        """Pass the next line to the waiting callback, if possible."""
+        if self._callback is None:
+            return
+
+        if b"\n" in self._buffer:
+            line, self._buffer = self._buffer.split(b"\n", 1)
+        elif self._eof and self._buffer:
+            line, self._buffer = self._buffer, b""
+        elif self._eof:
+            line = None
+        else:
+            return
+
+        callback, self._callback = self._callback, None
+        callback(line.decode("utf-8") if line is not None else None)
+
+    def _deliver_when_idle(self):
+        """Deliver a line that was already buffered."""
+        self._deliver()
+        return False
+
+    def read_line(self, prompt, callback):
+        """Show prompt and call callback with the line that was entered.
+
+        The line is None if the end of input was reached.
+        """
+        sys.stdout.write(prompt)
+        sys.stdout.flush()
+
+        self._callback = callback
+        if b"\n" in self._buffer or self._eof:
+            GLib.idle_add(self._deliver_when_idle)
+        elif self._watch_id is None:
+            self._watch_id = GLib.io_add_watch(self._fd,
+                                               GLib.PRIORITY_DEFAULT,
+                                               GLib.IO_IN | GLib.IO_HUP,
+                                               self._on_readable)
+
+    def cancel(self):
+        """Drop the line for any outstanding request."""
+        self._callback = None
+
+    def close(self):
+        """Stop watching the file descriptor."""
+        if self._watch_id is not None:
+            GLib.source_remove(self._watch_id)
+            self._watch_id = None
+
+
+def create_input_source(completer=None):
+    """Create the right input source for standard input.
+
+    completer is only used if standard input is a terminal.
+    """
+    if sys.stdin.isatty():
+        return ThreadedInputSource(completer)
+
+    return WatchedInputSource()
+
+
+class ScriptedInputSource(object):
+    """Read lines from a list, for driving showmehow from a script.
+
+    Each line is delivered on the main loop after think_time seconds,
+    as though someone had typed it. The time from delivering each line
+    to the next prompt, or to closing the input source, which is how
+    long showmehow took to respond, is recorded in latencies.
+    """
+
+    def __init__(self, lines, think_time=0):
+        """Initialise with the lines to enter."""
+        super(ScriptedInputSource, self).__init__()
+
+        self._lines = deque(lines)
+        self._think_time = think_time
+        self._delivered_at = None
+        self._source_id = None
+        self.latencies = []
+
+    def _deliver(self, callback):
+        """Pass the next line to callback."""
+        self._source_id = None
+        line = self._lines.popleft() if self._lines else None
+        if line is not None:
+            self._delivered_at = time.time()
+        callback(line)
+        return False
+
+    def _record_latency(self):
+        """Record how long it took to respond to the last line."""
+        if self._delivered_at is not None:
+            self.latencies.append(time.time() - self._delivered_at)
+            self._delivered_at = None
+
+    def read_line(self, prompt, callback):
+        """Call callback with the next line, or None if there are no more."""
+        del prompt
+
+        self._record_latency()
+
+        self._source_id = GLib.timeout_add(int(self._think_time * 1000),
+                                           self._deliver,
+                                           callback)
+
+    def cancel(self):
+        """Drop the line for any outstanding request."""
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+
+    def close(self):
+        """Stop delivering lines."""
+        self._record_latency()
+        self.cancel()
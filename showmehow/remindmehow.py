@@ -3,26 +3,46 @@
 # Copyright (c) 2016-2017 Endless Mobile Inc.
 #
 # remindmehow - entrypoint
-"""Entry point for showmehow."""
+"""Entry point for remindmehow."""
 
 import argparse
-import os
 import sys
-import textwrap
-import time
 
-import gi
+from showmehow.known import (read_known_tasks, write_known_tasks)
+from showmehow.lazy import GLib
+from showmehow.showmehow import (PracticeTaskStateMachine,
+                                 ServiceProxiesLoader,
+                                 TaskIndex,
+                                 load_lessons,
+                                 print_lines_slowly,
+                                 show_tasks)
 
-gi.require_version("Showmehow", "1.0")
-gi.require_version("Gio", "2.0")
 
-from gi.repository import (Gio, Showmehow)
+def fetch_known_tasks(service):
+    """Ask the service which lessons have been completed, and cache them."""
+    names = [spell[0] for spell in service.call_get_known_spells_sync("console")]
+    write_known_tasks(names)
+    return names
 
-from showmehow import (create_service,
-                       practice_task,
-                       print_lines_slowly,
-                       show_tasks,
-                       ReloadMonitor)
+
+def refresh_known_tasks(service):
+    """Ask the service which lessons have been completed, without waiting.
+
+    The cache is replaced when the service answers, which happens on
+    the main loop.
+    """
+    def _on_known_spells(source, result):
+        """Cache the names of the completed lessons."""
+        del source
+
+        try:
+            spells = service.call_get_known_spells_finish(result)
+        except GLib.Error:
+            return
+
+        write_known_tasks([spell[0] for spell in spells])
+
+    service.call_get_known_spells("console", None, _on_known_spells)
 
 
 def main(argv=None):
@@ -36,23 +56,40 @@ def main(argv=None):
 
     arguments = parser.parse_args(argv or sys.argv[1:])
 
-    service = create_service()
-    known_tasks = service.call_get_known_spells_sync("console")
+    # Only go to the service if nothing has been cached lately
+    proxies = None
+    names = read_known_tasks()
+    if names is None:
+        proxies = ServiceProxiesLoader()
+        service, _ = proxies.wait()
+        names = fetch_known_tasks(service)
+
+    lessons = load_lessons()
+    known_tasks = TaskIndex(lessons, names)
 
     if not len(known_tasks):
         print_lines_slowly("You haven't completed any tasks yet. "
                            "Run showmehow to complete some")
         return
 
-    try:
-        task = [t for t in known_tasks if t[0] == arguments.task][0]
-    except IndexError:
+    task = known_tasks.find(arguments.task)
+    if task is None:
         if arguments.task:
-            print_lines_slowly("You haven't completed tasks {}".format(arguments.task))
+            print_lines_slowly("You haven't completed task {}".format(arguments.task))
         else:
             print_lines_slowly("You've done the following tasks:")
         return show_tasks(known_tasks)
 
-    with ReloadMonitor(service) as monitor:
-        return practice_task(service, monitor, *task)
+    refresh = proxies is None
+    service, coding_game_service = (proxies or ServiceProxiesLoader()).wait()
+    if refresh:
+        # The service is running for the lesson anyway, so bring the
+        # cache up to date while it runs
+        refresh_known_tasks(service)
 
+    with PracticeTaskStateMachine(service,
+                                  coding_game_service,
+                                  lessons,
+                                  task.name,
+                                  task.entry) as machine:
+        machine.start()
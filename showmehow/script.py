@@ -0,0 +1,245 @@
+# /showmehow/script.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - scripted runs through lessons
+"""Run scripted attempts at lessons, for grading and regression testing.
+
+A script is a JSON list of runs, each of which starts a lesson, at its
+entry task unless another task is given, and types in a list of inputs:
+
+    [
+        {"lesson": "info", "inputs": ["showmehow", "showmehow info"]},
+        {"lesson": "fortune", "task": "fortune", "inputs": ["fortune"]}
+    ]
+
+Each run gets a PracticeTaskStateMachine of its own, which reads its
+inputs from a ScriptedInputSource and has its attempts checked by the
+service, as they would be interactively. Up to jobs runs go at once on
+one main loop and one pair of service proxies, so attempts from several
+runs are in flight with the service at the same time. Attempts within a
+run still wait for each other, since the task that an input is for
+depends on the result of the attempt before it.
+
+A JSON object is written per line for each attempt and at the end of
+each run, with timings in milliseconds. The last line has the hits and
+misses of the attempt cache:
+
+    {"attempt_cache": {"entries": N, "hits": N, "misses": N}}
+"""
+
+import json
+import os
+import sys
+import time
+
+from collections import deque
+
+from showmehow.catalog import StaleCatalogError
+from showmehow.known import forget_known_tasks
+from showmehow.lazy import GLib
+from showmehow.prompt import ScriptedInputSource
+from showmehow.showmehow import (ATTEMPT_CACHE,
+                                 PracticeTaskStateMachine,
+                                 reload_lessons)
+from showmehow.typewriter import (Typewriter, set_default_typewriter)
+
+
+class _Run(object):
+    """What is known about a run so far."""
+
+    def __init__(self, index, lesson):
+        """Initialise with the index of the run in the script and its lesson."""
+        super(_Run, self).__init__()
+        self.index = index
+        self.lesson = lesson
+        self.steps = 0
+        self.completed = False
+        self.started_at = time.time()
+
+
+class ScriptRunner(object):
+    """Run the runs in a script, up to jobs at a time.
+
+    Results are written to output as JSON lines.
+    """
+
+    def __init__(self, service, coding_game_service, lessons, unlocked_tasks,
+                 output, jobs=4):
+        """Initialise with the services, lessons and unlocked tasks."""
+        super(ScriptRunner, self).__init__()
+
+        self._service = service
+        self._coding_game_service = coding_game_service
+        self._lessons = lessons
+        self._unlocked_tasks = unlocked_tasks
+        self._output = output
+        self._jobs = jobs
+        self._loop = GLib.MainLoop()
+        self._pending = deque()
+        self._running = 0
+        self._errors = 0
+
+    def _write(self, record):
+        """Write record as a line of JSON."""
+        self._output.write(json.dumps(record, sort_keys=True) + "\n")
+        self._output.flush()
+
+    def _error(self, record, message):
+        """Write record for a run which could not be started, with message."""
+        self._errors += 1
+        record["error"] = message
+        self._write(record)
+
+    def _start(self, index, run):
+        """Start a state machine for run, unless it is not valid."""
+        if not isinstance(run, dict):
+            self._error({"run": index, "lesson": None},
+                        "A run must be an object, not {}".format(json.dumps(run)))
+            return
+
+        lesson = run.get("lesson")
+        if lesson not in self._lessons:
+            self._error({"run": index, "lesson": lesson},
+                        "Unknown lesson {}".format(lesson))
+            return
+
+        task = run.get("task", self._lessons.lesson(lesson).entry)
+        try:
+            try:
+                self._lessons.task(lesson, task)
+            except StaleCatalogError:
+                # The lessons changed since they were loaded
+                reload_lessons(self._lessons)
+                self._lessons.task(lesson, task)
+        except (KeyError, TypeError, StaleCatalogError):
+            self._error({"run": index, "lesson": lesson, "task": task},
+                        "Unknown task {} in lesson {}".format(task, lesson))
+            return
+
+        state = _Run(index, lesson)
+        self._running += 1
+        PracticeTaskStateMachine(
+            self._service,
+            self._coding_game_service,
+            self._lessons,
+            lesson,
+            task,
+            input_source=ScriptedInputSource(run.get("inputs", [])),
+            unlocked_tasks=self._unlocked_tasks,
+            on_attempt=lambda *args: self._on_attempt(state, *args),
+            on_finished=lambda machine: self._on_finished(state, machine),
+            owns_lessons=False
+        ).begin()
+
+    def _start_pending(self):
+        """Start pending runs while fewer than jobs are running."""
+        while self._pending and self._running < self._jobs:
+            self._start(*self._pending.popleft())
+
+        if not self._running:
+            self._loop.quit()
+
+    def _on_attempt(self, state, lesson, task, user_input, result, transition,
+                    duration):
+        """Write the result of an attempt in a run."""
+        state.steps += 1
+        state.completed = transition.completes_lesson
+        self._write({
+            "run": state.index,
+            "lesson": lesson,
+            "task": task,
+            "input": user_input,
+            "result": result,
+            "next_task": None if transition.completes_lesson else transition.move_to,
+            "completes_lesson": transition.completes_lesson,
+            "local": self._lessons.checks_locally(lesson, task),
+            "ms": round(duration * 1000, 3)
+        })
+
+    def _on_finished(self, state, machine):
+        """Write the summary of a run and close its state machine."""
+        self._write({
+            "run": state.index,
+            "lesson": state.lesson,
+            "steps": state.steps,
+            "completed": state.completed,
+            "ms": round((time.time() - state.started_at) * 1000, 3)
+        })
+
+        # Close from an idle callback, once the attempt has been handled
+        GLib.idle_add(self._close, machine)
+
+    def _on_lessons_changed(self, *args):
+        """Load the lessons again, once for every run that shares them."""
+        del args
+
+        forget_known_tasks()
+        ATTEMPT_CACHE.clear()
+        reload_lessons(self._lessons)
+
+    def _close(self, machine):
+        """Close machine and make room for the next run."""
+        machine.close()
+        self._running -= 1
+        self._start_pending()
+        return False
+
+    def run(self, runs):
+        """Run every run in runs, returning the number which had errors."""
+        self._pending.extend(enumerate(runs))
+        lessons_changed_id = self._service.connect("lessons-changed",
+                                                   self._on_lessons_changed)
+        try:
+            self._start_pending()
+            if self._running:
+                self._loop.run()
+        finally:
+            self._service.disconnect(lessons_changed_id)
+
+        self._write({"attempt_cache": ATTEMPT_CACHE.stats()})
+        return self._errors
+
+
+def read_script(path):
+    """Read the runs in the script at path, or standard input if it is -."""
+    if path == "-":
+        runs = json.load(sys.stdin)
+    else:
+        with open(path) as script_stream:
+            runs = json.load(script_stream)
+
+    if not isinstance(runs, list):
+        raise ValueError("A script must be a list of runs")
+
+    return runs
+
+
+def run_script(path, service, coding_game_service, lessons, unlocked_tasks,
+               jobs=4):
+    """Run the script at path, writing JSON lines to standard output.
+
+    Anything that showmehow would normally print is thrown away, so
+    that only the results are written.
+    """
+    try:
+        runs = read_script(path)
+    except (IOError, ValueError) as error:
+        sys.stderr.write("Could not read script {}: {}\n".format(path, error))
+        return 1
+
+    output = sys.stdout
+    with open(os.devnull, "w") as null:
+        set_default_typewriter(Typewriter(stream=null, animate=False))
+        sys.stdout = null
+        try:
+            errors = ScriptRunner(service,
+                                  coding_game_service,
+                                  lessons,
+                                  unlocked_tasks,
+                                  output,
+                                  jobs).run(runs)
+        finally:
+            sys.stdout = output
+
+    return 1 if errors else 0
@@ -5,44 +5,46 @@
 # showmehow - entrypoint
 """Entry point for showmehow."""
 
+# Imported first, so that the startup profile covers all the other imports
+from showmehow.profiling import STARTUP
+
 import argparse
 import atexit
-import errno
+import functools
 import itertools
 import json
 import os
-import re
-import readline
 import sys
 import textwrap
 import time
 
-from collections import (defaultdict, namedtuple)
-
-import gi
-
-gi.require_version("CodingGameService", "1.0")
-gi.require_version("Showmehow", "1.0")
-gi.require_version("GLib", "2.0")
-gi.require_version("Gio", "2.0")
-
-from gi.repository import (CodingGameService, GLib, Gio, Showmehow)
-
-# Assign 'input' to raw_input if running on Python 2
-try:
-    input = raw_input
-except NameError:
-    pass
-
-
-readline.parse_and_bind("tab: complete")
-
-_PAUSECHARS = ".?!:"
+from collections import (OrderedDict, defaultdict, deque, namedtuple)
+
+from showmehow.banner import print_banner
+from showmehow.catalog import (StaleCatalogError, load_catalog)
+from showmehow.checkpoint import (clear_checkpoint,
+                                  read_checkpoint,
+                                  write_checkpoint)
+from showmehow.compiler import (LEVELS,
+                                LessonValidationError,
+                                normalize_input)
+from showmehow.completer import (PrefixTrie, PromptCompleter)
+from showmehow.completion import write_unlocked_names
+from showmehow.known import (add_known_task, forget_known_tasks)
+from showmehow.lazy import (CodingGameService, GLib, Gio, Showmehow)
+from showmehow.model import SideEffect
+from showmehow.prompt import create_input_source
+from showmehow.tracing import TRACE
+from showmehow.typewriter import (default_typewriter,
+                                  stdout_is_tty,
+                                  terminal_width,
+                                  using_typewriter)
 
 
 def in_blue(text):
     """Wrap text using ANSI blue color code."""
-    if not sys.stdout.isatty():
+    colour = default_typewriter().colour
+    if not (stdout_is_tty() if colour is None else colour):
         return text
 
     blue = '\033[95m'
@@ -51,36 +53,21 @@ def in_blue(text):
 
 
 def print_lines_slowly(text, newline=True):
-    """Print each character in the line to the standard output."""
-    if os.environ.get("NONINTERACTIVE", None):
-        print(text)
-        return
-
-    text = text + " "
-    for ind in range(0, len(text)):
-        sys.stdout.write(text[ind])
-        sys.stdout.flush()
-        time.sleep(0.5 if text[ind] in _PAUSECHARS and
-                   text[ind + 1] == " " else 0.02)
-
-    if newline:
-        sys.stdout.write("\n")
+    """Type out the text on the standard output."""
+    default_typewriter().write(text, newline=newline)
 
 
 def print_message_slowly_and_wait(message, wait_time=2):
     """Print message slowly and wait a few seconds, printing dots."""
     print_lines_slowly(message, newline=False)
-    for i in range(0, wait_time):
-        sys.stdout.write(".")
-        sys.stdout.flush()
-        time.sleep(1)
+    default_typewriter().dots(wait_time)
 
-    print("")
+    default_typewriter().show("")
 
 
 def show_response(value):
     """Print text, quickly."""
-    print(value)
+    default_typewriter().show(value)
 
 
 class WaitTextFunctor(object):
@@ -99,14 +86,25 @@ class WaitTextFunctor(object):
         print_message_slowly_and_wait(in_blue(text), self._wait_time)
 
 
-def show_response_scrolled(value):
-    """Print scrolled text.
+def render_scrolled(value):
+    """Wrap value to the terminal width and colour it, ready to print.
 
     Lines are split into separate paragraphs on \n first before wrapping. This
     is to enable newlines to be printed correctly without extraneous whitespace
-    on either side.
+    on either side. Words are never broken, even at hyphens, since users copy
+    things like URLs and settings keys out of the text.
     """
-    print_lines_slowly(in_blue(value))
+    width = default_typewriter().width or terminal_width()
+    return in_blue("\n".join(textwrap.fill(paragraph,
+                                           width,
+                                           break_on_hyphens=False,
+                                           break_long_words=False)
+                             for paragraph in value.split("\n")))
+
+
+def show_response_scrolled(value):
+    """Print scrolled text."""
+    print_lines_slowly(render_scrolled(value))
 
 
 _RESPONSE_ACTIONS = {
@@ -139,14 +137,16 @@ def display_input_prompt(prompt):
     return _internal
 
 
-def display_input():
-    """Display a prompt to the user depending on the input type.
+def display_input(input_source, callback):
+    """Display a prompt to the user and pass what they enter to callback.
 
-    Because this function calls raw_input, it will block the event loop,
-    which in the current design is fine because we don't need to respond
-    to external events.
+    The line is read in the background, so the main loop keeps handling
+    D-Bus signals and replies, and can do other work, while the user
+    is typing.
     """
-    return input("$ ")
+    STARTUP.mark("first prompt")
+    STARTUP.finish()
+    input_source.read_line("$ ", callback)
 
 
 def handle_user_input_text(text, *args):
@@ -164,30 +164,386 @@ _INPUT_STATE_TRANSITIONS = defaultdict(lambda: "waiting",
                                        external_events="waiting_lesson_events")
 
 
-def find_task_json(json_file, lesson, task):
-    """Find a descriptor associated with a given lesson and task."""
-    return [l for l in json_file if l["name"] == lesson][0]["practice"][task]
+def _run_event_side_effect(effect, coding_game_service, done):
+    """Dispatch an external event for coding-game-service.
 
+    done is called with None once the event has been dispatched, or
+    with the error if dispatching it failed.
+    """
+    def _on_event_dispatched(source, result):
+        """Finish dispatching the event."""
+        del source
 
-def _run_event_side_effect(effect, coding_game_service):
-    """Dispatch an external event for coding-game-service."""
-    try:
-        coding_game_service.call_external_event_sync(effect["value"], None)
-    except GLib.Error as error:
-        # This is an error stating that the service was not interested
-        # in this event right now. In that case, we don't care. Continue.
-        if error.matches("coding-game-service", 2):
-            pass
+        try:
+            coding_game_service.call_external_event_finish(result)
+        except GLib.Error as error:
+            # This is an error stating that the service was not interested
+            # in this event right now. In that case, we don't care. Continue.
+            if not error.matches("coding-game-service", 2):
+                done(error)
+                return
 
+        done(None)
 
+    coding_game_service.call_external_event(effect.value,
+                                            None,
+                                            _on_event_dispatched)
+
+
+# Keep showmehow.compiler.SIDE_EFFECT_TYPES in sync with this
 _SIDE_EFFECT_DISPATCH = {
     "event": _run_event_side_effect
 }
 
+_TASK_COMPLETED = SideEffect("event", "showmehow-task-completed")
+
+
+def run_main_context_until(predicate, timeout):
+    """Run the default main context until predicate() is true.
+
+    Give up after timeout seconds. This works whether or not a main
+    loop is running, so it can be used to finish outstanding calls
+    when exiting.
+    """
+    if predicate():
+        return
+
+    expired = []
+    timeout_id = GLib.timeout_add(int(timeout * 1000),
+                                  lambda: expired.append(True))
+    context = GLib.MainContext.default()
+    while not predicate() and not expired:
+        context.iteration(True)
+
+    if not expired:
+        GLib.source_remove(timeout_id)
+
+
+class SideEffectQueueFull(Exception):
+    """Raised when a side effect is dropped because the queue is full."""
+    pass
+
+
+class SideEffectQueue(object):
+    """A bounded queue of side effects, dispatched asynchronously.
+
+    Up to max_in_flight side effects are dispatched to coding-game-service
+    at once, pipelined over the same connection so that they still arrive
+    in order. The rest wait in the queue, up to max_queued of them, after
+    which new side effects are dropped. Once each side effect has been
+    dispatched, or dropped, callback is called with the side effect and
+    None, or the error.
+    """
+
+    def __init__(self, coding_game_service, callback,
+                 max_in_flight=4, max_queued=32):
+        """Initialise the queue."""
+        super(SideEffectQueue, self).__init__()
+
+        self._coding_game_service = coding_game_service
+        self._callback = callback
+        self._max_in_flight = max_in_flight
+        self._max_queued = max_queued
+        self._queued = deque()
+        self._in_flight = 0
+
+    def __len__(self):
+        """Return the number of side effects queued or in flight."""
+        return len(self._queued) + self._in_flight
+
+    def push(self, effect):
+        """Queue effect for dispatch."""
+        if len(self._queued) >= self._max_queued:
+            self._callback(effect, SideEffectQueueFull(
+                "Dropped side effect {}".format(effect.value)
+            ))
+            return
+
+        self._queued.append(effect)
+        self._dispatch_queued()
+
+    def _dispatch_queued(self):
+        """Dispatch queued side effects while there is room in flight."""
+        while self._queued and self._in_flight < self._max_in_flight:
+            effect = self._queued.popleft()
+            span = TRACE.begin("side-effect", value=effect.value)
+            self._in_flight += 1
+            _SIDE_EFFECT_DISPATCH[effect.type](
+                effect,
+                self._coding_game_service,
+                lambda error, effect=effect, span=span: self._on_dispatched(effect,
+                                                                            error,
+                                                                            span)
+            )
+
+    def _on_dispatched(self, effect, error, span):
+        """Report that effect was dispatched and make room for the next."""
+        TRACE.end(span)
+        self._in_flight -= 1
+        self._callback(effect, error)
+        self._dispatch_queued()
+
+    def flush(self, timeout=2):
+        """Wait up to timeout seconds for everything to be dispatched.
+
+        This runs the default main context, so that it can be used
+        when exiting, whether or not a main loop is running.
+        """
+        run_main_context_until(lambda: not len(self), timeout)
+
+
+class SessionPool(object):
+    """Sessions with the service, opened lazily and kept warm.
+
+    Only lessons which declare requires_session get a session at all.
+    When the user moves on to another lesson, the session for the last
+    one is kept open as an idle session, so that going back to it is
+    free. Only max_idle idle sessions are kept, beyond which the least
+    recently used ones are closed. Sessions are opened and closed
+    asynchronously.
+    """
+
+    def __init__(self, service, lessons, on_error, max_idle=1):
+        """Initialise the pool.
+
+        If a session cannot be opened, on_error is called with the
+        lesson and the error, rather than the callbacks waiting for it.
+        """
+        super(SessionPool, self).__init__()
+
+        self._service = service
+        self._lessons = lessons
+        self._on_error = on_error
+        self._max_idle = max_idle
+        self._sessions = OrderedDict()
+        self._opening = {}
+        self._closing = 0
+
+    def acquire(self, lesson, callback):
+        """Make lesson the lesson in use and call callback with its session.
+
+        The session is -1 if the lesson does not require one. callback
+        is called straight away if no session has to be opened.
+        """
+        if not self._lessons.lesson(lesson).requires_session:
+            callback(-1)
+            return
+
+        if lesson in self._sessions:
+            # Mark this session as the most recently used one
+            session = self._sessions.pop(lesson)
+            self._sessions[lesson] = session
+            callback(session)
+            return
+
+        if lesson in self._opening:
+            self._opening[lesson].append(callback)
+            return
+
+        self._opening[lesson] = [callback]
+        self._service.call_open_session(lesson,
+                                        None,
+                                        self._on_session_opened,
+                                        lesson,
+                                        TRACE.begin("session.open", lesson=lesson))
+
+    def _on_session_opened(self, source, result, lesson, span):
+        """Finish opening the session for lesson and pass it on."""
+        del source
+
+        TRACE.end(span)
+        try:
+            session = self._service.call_open_session_finish(result)
+        except Exception as error:
+            del self._opening[lesson]
+            self._on_error(lesson, error)
+            return
+
+        self._sessions[lesson] = session
+        for callback in self._opening.pop(lesson):
+            callback(session)
+
+        self._close_idle(lesson)
+
+    def _close_idle(self, in_use):
+        """Close the least recently used idle sessions beyond max_idle."""
+        idle = [lesson for lesson in self._sessions if lesson != in_use]
+        for lesson in idle[:max(len(idle) - self._max_idle, 0)]:
+            self._close(lesson)
+
+    def _close(self, lesson):
+        """Close the session for lesson."""
+        self._closing += 1
+        self._service.call_close_session(self._sessions.pop(lesson),
+                                         None,
+                                         self._on_session_closed,
+                                         TRACE.begin("session.close", lesson=lesson))
+
+    def _on_session_closed(self, source, result, span):
+        """Finish closing a session."""
+        del source
+
+        TRACE.end(span)
+        self._closing -= 1
+        try:
+            self._service.call_close_session_finish(result)
+        except GLib.Error:
+            # The session is gone as far as we are concerned either way
+            pass
+
+    def close_all(self, timeout=2):
+        """Close every session, waiting up to timeout seconds."""
+        for lesson in list(self._sessions):
+            self._close(lesson)
+
+        run_main_context_until(lambda: not self._closing, timeout)
+
+
+class AttemptCache(object):
+    """Results of attempts at deterministic tasks, to reuse for the same input.
+
+    People often enter the same wrong answer several times. At tasks
+    where the service always gives the same result for the same input,
+    the result and responses of each attempt are kept, keyed by lesson,
+    task and normalized input, so that entering it again does not go
+    back to the service. Only max_entries results are kept, beyond
+    which the least recently used ones are evicted. The number of hits
+    and misses are counted in hits and misses.
+    """
+
+    def __init__(self, max_entries=256):
+        """Initialise an empty cache."""
+        super(AttemptCache, self).__init__()
+
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """Return the number of results in the cache."""
+        return len(self._entries)
+
+    def get(self, lesson, task, user_input):
+        """Get the (result, responses) of user_input at task, or None."""
+        key = (lesson, task, normalize_input(user_input))
+        try:
+            # Mark this entry as the most recently used one
+            entry = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._entries[key] = entry
+        self.hits += 1
+        return entry
+
+    def put(self, lesson, task, user_input, result, responses):
+        """Keep the result and responses of user_input at task."""
+        key = (lesson, task, normalize_input(user_input))
+        self._entries.pop(key, None)
+        self._entries[key] = (result, tuple(responses))
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Forget every result."""
+        self._entries.clear()
+
+    def forget(self, lessons):
+        """Forget the results at the tasks in lessons, for when they change."""
+        for key in [key for key in self._entries if key[0] in lessons]:
+            del self._entries[key]
+
+    def stats(self):
+        """Get the hits, misses and size of the cache as a dict."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries)
+        }
+
+
+ATTEMPT_CACHE = AttemptCache()
+
+
+# How long to wait for the service to check an attempt, in seconds, how
+# many times to try again if it fails at a task marked deterministic,
+# how long to wait before trying again, doubling for each retry, and how
+# long to wait before showing that the attempt is still being checked.
+# The timeout is the default for D-Bus calls, which is how long attempts
+# always had: some tasks download things or play media, and those are
+# never tried again.
+AttemptPolicy = namedtuple("AttemptPolicy",
+                           "timeout retries backoff progress_delay")
+
+DEFAULT_ATTEMPT_POLICY = AttemptPolicy(timeout=25,
+                                       retries=2,
+                                       backoff=0.5,
+                                       progress_delay=0.75)
+
+
+class _Attempt(object):
+    """An attempt which is being checked by the service.
+
+    Each call to the service for the attempt gets a new call_id, which
+    is cleared when the call is given up on, so that a late reply to
+    it can be told apart from the reply to the current call.
+    """
+
+    def __init__(self, lesson, task, user_input):
+        """Initialise with the task and what the user entered."""
+        super(_Attempt, self).__init__()
+        self.lesson = lesson
+        self.task = task
+        self.user_input = user_input
+        self.session = None
+        self.tries = 0
+        self.call_id = None
+        self.cancellable = None
+        self.deadline_id = None
+        self.span = None
+
+
+def _with_own_typewriter(method):
+    """Make a PracticeTaskStateMachine method write with its own typewriter.
+
+    This is for methods which are called from the main loop, so that
+    when several state machines share a process, what each one writes
+    goes to the right place.
+    """
+    @functools.wraps(method)
+    def _wrapper(self, *args, **kwargs):
+        """Call method with the typewriter of the state machine."""
+        with using_typewriter(self._typewriter):
+            return method(self, *args, **kwargs)
+
+    return _wrapper
+
+
+def _quit_on_stale_lessons(method):
+    """Make a PracticeTaskStateMachine method quit if the lessons went stale.
 
-def dispatch_side_effect(effect, coding_game_service):
-    """Cause :effect: to be dispatched with :service:."""
-    return _SIDE_EFFECT_DISPATCH[effect["type"]](effect, coding_game_service)
+    Tasks are loaded from the catalog as they are needed, and if the
+    shard for a lesson is gone and lessons.json changed since the
+    catalog was read, the task cannot be loaded. The state machine is
+    left with nothing consistent to carry on from, so it tells the user
+    and quits. The catalog is then loaded again, so that anything else
+    which shares it is not left with the same problem.
+    """
+    @functools.wraps(method)
+    def _wrapper(self, *args, **kwargs):
+        """Call method, quitting if the lessons went stale."""
+        try:
+            return method(self, *args, **kwargs)
+        except StaleCatalogError:
+            if self._state != "finished":
+                self._abandon_attempt()
+                default_typewriter().show("Lessons changed - aborting")
+                self.quit()
+            reload_lessons(self._lessons)
+
+    return _wrapper
 
 
 class PracticeTaskStateMachine(object):
@@ -205,156 +561,571 @@ class PracticeTaskStateMachine(object):
       S -> F, E
     ."""
 
-    def __init__(self, service, coding_game_service, lessons, lesson, task):
+    def __init__(self, service, coding_game_service, lessons, lesson, task,
+                 input_source=None, unlocked_tasks=None,
+                 on_attempt=None, on_finished=None, typewriter=None,
+                 checkpoint=False, attempt_policy=None, completer=None,
+                 owns_lessons=True):
         """Initialise this state machine with the service.
 
         Connect to the relevant signals to handle state transitions.
+        Input is read from input_source, or from standard input if
+        it is not given. unlocked_tasks is the UnlockedTaskIndex to
+        use, if one was already built.
+
+        If on_attempt is given, it is called after each attempt with
+        the lesson, task, input, result, Effect and how long the
+        attempt took. If on_finished is given, it is called with this
+        state machine when it is finished, instead of quitting the main
+        loop, so that several state machines can share one main loop.
+        If typewriter is given, everything is written with it, rather
+        than with the default typewriter. If checkpoint is True, the
+        task that the user is at is written to the progress checkpoint
+        whenever it changes. attempt_policy is the AttemptPolicy for
+        attempts checked by the service, DEFAULT_ATTEMPT_POLICY if it
+        is not given. completer is the PromptCompleter which input_source
+        completes words with, if it was made with one, and is kept up
+        to date with the task that the user is at. If owns_lessons is
+        False, lessons are shared with other state machines, and whoever
+        shares them loads them again when the service says they changed,
+        rather than each state machine doing so.
         """
         super(PracticeTaskStateMachine, self).__init__()
 
+        if unlocked_tasks is None:
+            unlocked_tasks = UnlockedTaskIndex(lessons)
+        self._unlocked_tasks = unlocked_tasks
+        if completer is None:
+            completer = PromptCompleter(lessons, self._unlocked_tasks)
+        self._completer = completer
+        self._input = input_source or create_input_source(self._completer)
         self._service = service
         self._coding_game_service = coding_game_service
-        self._service.connect("lessons-changed", self.handle_lessons_changed)
+        self._lessons_changed_id = None
+        if owns_lessons:
+            self._lessons_changed_id = self._service.connect("lessons-changed",
+                                                             self.handle_lessons_changed)
+        self._lessons_reloaded_id = lessons.connect_reloaded(self.handle_lessons_reloaded)
         self._loop = GLib.MainLoop()
+        self._on_attempt = on_attempt
+        self._on_finished = on_finished
+        self._typewriter = typewriter
+        self._checkpoint = checkpoint
+        self._submitted = (None, 0)
         self._lessons = lessons
-        self._session = -1
+        self._attempt_cache = ATTEMPT_CACHE
+        self._attempt_policy = attempt_policy or DEFAULT_ATTEMPT_POLICY
+        self._attempt = None
+        self._last_call_id = 0
+        self._progress_id = None
+        self._progress_shown = False
+        self._sessions = SessionPool(service, lessons, self.handle_session_failed)
+        self._side_effects = SideEffectQueue(coding_game_service,
+                                             self.handle_side_effect_dispatched)
+        self._rendered = {}
         self._initialize(lesson, task)
 
     def __enter__(self):
         """Enter the context of this PracticeTaskStateMachine.
 
-        This might involve opening a session with the service if
-        the underlying lesson requires it.
+        Sessions with the service are only opened as lessons which
+        require them are started.
         """
-        self._session = self._service.call_open_session_sync(self._lesson, None)
-
         return self
 
     def __exit__(self, exc_type, value, traceback):
-        """Exit the context of this PracticeTaskStateMachine.
-
-        If we have a session open, close it.
-        """
+        """Exit the context of this PracticeTaskStateMachine."""
         del exc_type
         del value
         del traceback
 
-        if self._session != -1:
-            self._session = self._service.call_close_session_sync(self._session, None)
+        self.close()
+
+    def close(self):
+        """Finish dispatching side effects and close any open sessions."""
+        self._abandon_attempt()
+        if self._lessons_changed_id is not None:
+            self._service.disconnect(self._lessons_changed_id)
+        self._lessons.disconnect_reloaded(self._lessons_reloaded_id)
+        self._input.close()
+        self._side_effects.flush()
+        self._sessions.close_all()
 
     def _initialize(self, lesson, task):
         """Initialise the lesson state of showmehow and go to the first task."""
-        last_session = self._session
-
-        self._session = -1
         self._lesson = lesson
         self._task = task
         self._state = "fetching"
+        self._rendered.clear()
+        if self._checkpoint and lesson:
+            write_checkpoint(lesson, task)
+
+        # Start opening a session now if the lesson needs one, so that
+        # it is ready by the time the user submits something.
+        self._sessions.acquire(lesson, lambda session: None)
+
+    def _submit(self, user_input):
+        """Submit user_input for the current task.
+
+        Tasks with local matchers are checked straight away, as are
+        inputs whose result is in the attempt cache. Otherwise the
+        input goes to the service and if the session for the lesson
+        is still being opened, the attempt is made as soon as it is ready.
+        If checking it takes a while, the user is shown that it is still
+        being checked.
+        """
+        lesson = self._lesson
+        task = self._task
+
+        self._state = "submit"
+        self._submitted = (user_input, time.time())
+        if self._lessons.checks_locally(lesson, task):
+            with TRACE.span("attempt.local", lesson=lesson, task=task):
+                result = self._lessons.local_result(lesson, task, user_input)
+            self.handle_attempt_result(result, [])
+            return
 
-        # If we had a session open, close it and reopen one for this task
-        if last_session != -1:
-            self._service.call_close_session_sync(last_session, None)
-            self._session = self._service.call_open_session_sync(self._lesson, None)
+        if self._lessons.is_deterministic(lesson, task):
+            cached = self._attempt_cache.get(lesson, task, user_input)
+            if cached is not None:
+                with TRACE.span("attempt.cached", lesson=lesson, task=task):
+                    self.handle_attempt_result(*cached)
+                return
+
+        attempt = self._attempt = _Attempt(lesson, task, user_input)
+        self._progress_id = GLib.timeout_add(
+            int(self._attempt_policy.progress_delay * 1000),
+            self._show_progress
+        )
+
+        def _attempt(session):
+            """Attempt the task in session."""
+            attempt.session = session
+            self._call_attempt(attempt)
+
+        self._sessions.acquire(lesson, _attempt)
+
+    def _call_attempt(self, attempt):
+        """Have the service check attempt, giving up at the deadline."""
+        if attempt is not self._attempt:
+            # Cancelled while waiting for a session or to try again
+            return False
+
+        policy = self._attempt_policy
+        self._last_call_id += 1
+        attempt.call_id = self._last_call_id
+        attempt.tries += 1
+        attempt.cancellable = Gio.Cancellable.new()
+        attempt.deadline_id = GLib.timeout_add(int(policy.timeout * 1000),
+                                               self._on_attempt_deadline,
+                                               attempt,
+                                               attempt.call_id)
+        attempt.span = TRACE.begin("attempt",
+                                   lesson=attempt.lesson,
+                                   task=attempt.task,
+                                   tries=attempt.tries)
+        self._service.call_attempt_lesson_remote(attempt.session,
+                                                 attempt.lesson,
+                                                 attempt.task,
+                                                 attempt.user_input,
+                                                 attempt.cancellable,
+                                                 self.handle_attempt_lesson_remote,
+                                                 attempt,
+                                                 attempt.call_id)
+        return False
+
+    def _end_call(self, attempt):
+        """Stop waiting for the current call to the service for attempt."""
+        TRACE.end(attempt.span)
+        attempt.span = None
+        attempt.call_id = None
+        if attempt.deadline_id is not None:
+            GLib.source_remove(attempt.deadline_id)
+            attempt.deadline_id = None
+
+    def _on_attempt_deadline(self, attempt, call_id):
+        """Give up on a call to the service which took too long."""
+        if attempt is self._attempt and attempt.call_id == call_id:
+            attempt.deadline_id = None
+            attempt.cancellable.cancel()
+            self._attempt_failed(attempt, "the service took too long")
+
+        return False
+
+    @_with_own_typewriter
+    @_quit_on_stale_lessons
+    def _attempt_failed(self, attempt, reason):
+        """Try attempt again, or tell the user it could not be checked.
+
+        Only attempts at tasks marked deterministic in the lessons are
+        tried again, since the service only checks their text. At other
+        tasks the service might already have run what was typed, changing
+        a setting or downloading something, even if the call was given up
+        on, so it must not be run twice.
+        """
+        self._end_call(attempt)
+
+        policy = self._attempt_policy
+        if (attempt.tries <= policy.retries and
+            self._lessons.is_deterministic(attempt.lesson, attempt.task)):
+            GLib.timeout_add(int(policy.backoff * 2 ** (attempt.tries - 1) * 1000),
+                             self._call_attempt,
+                             attempt)
+            return
+
+        self._attempt = None
+        self._hide_progress()
+        show_response_scrolled("I couldn't check that, because {}. "
+                               "Try again?".format(reason))
+        self._state = "waiting"
+        display_input(self._input, self.handle_user_input)
+
+    def _abandon_attempt(self):
+        """Stop checking the attempt in flight, returning True if there was one."""
+        attempt, self._attempt = self._attempt, None
+        if attempt is None:
+            return False
+
+        if attempt.call_id is not None:
+            attempt.cancellable.cancel()
+            self._end_call(attempt)
+
+        self._hide_progress()
+        return True
 
+    @_with_own_typewriter
+    def cancel_attempt(self):
+        """Cancel the attempt being checked and go back to the prompt.
+
+        Returns True if there was an attempt to cancel.
+        """
+        if not self._abandon_attempt():
+            return False
+
+        default_typewriter().show("Cancelled.")
+        self._state = "waiting"
+        display_input(self._input, self.handle_user_input)
+        return True
+
+    def interrupt(self):
+        """Handle Ctrl-C, by cancelling the attempt being checked or quitting."""
+        if self._state != "finished" and not self.cancel_attempt():
+            self.quit()
+
+    @_with_own_typewriter
+    def _show_progress(self):
+        """Show that the attempt is still being checked, a dot at a time."""
+        if not self._progress_shown:
+            self._progress_shown = True
+            print_lines_slowly("Checking", newline=False)
+            self._progress_id = GLib.timeout_add(500, self._show_progress)
+            return False
+
+        default_typewriter().dots(1, interval=0)
+        return True
+
+    def _hide_progress(self):
+        """Stop showing that the attempt is being checked."""
+        if self._progress_id is not None:
+            GLib.source_remove(self._progress_id)
+            self._progress_id = None
+
+        if self._progress_shown:
+            self._progress_shown = False
+            with using_typewriter(self._typewriter):
+                default_typewriter().show("")
+
+    def _render(self, text):
+        """Get text rendered by render_scrolled, rendering it if needed."""
+        try:
+            return self._rendered[text]
+        except KeyError:
+            rendered = self._rendered[text] = render_scrolled(text)
+            return rendered
+
+    @_with_own_typewriter
+    @_quit_on_stale_lessons
+    def _prerender(self, lesson, task):
+        """Render whatever might be shown after an attempt at task.
+
+        This is done while the user is typing, so that the replies to
+        the task, and the next task after a successful attempt, can be
+        shown straight away.
+        """
+        if lesson != self._lesson:
+            return False
+
+        with TRACE.span("prerender", lesson=lesson, task=task):
+            for result, effect in self._lessons.task(lesson, task).effects.items():
+                self._render(effect.reply)
+                if (result == "success" and
+                    not effect.completes_lesson and
+                    effect.move_to != task):
+                    self._render(self._lessons.task(lesson,
+                                                    effect.move_to).description)
+
+        return False
+
+    @_with_own_typewriter
+    @_quit_on_stale_lessons
     def _show_next_task(self):
         """Start the very first part of the state machine."""
-        self.handle_task_description_fetched(find_task_json(self._lessons,
-                                                            self._lesson,
-                                                            self._task))
+        self.handle_task_description_fetched(self._lessons.task(self._lesson,
+                                                                self._task))
+
+    def begin(self):
+        """Show the first task once the main loop is running."""
+        GLib.idle_add(self._show_next_task)
 
     def start(self):
-        """Start the state machine and the underlying main loop."""
-        try:
-            GLib.idle_add(self._show_next_task)
-            return self._loop.run()
-        except KeyboardInterrupt:
-            self.quit()
+        """Start the state machine and the underlying main loop.
+
+        Pressing Ctrl-C cancels the attempt being checked, if there is
+        one, or quits, as interrupt does.
+        """
+        self.begin()
+        while True:
+            try:
+                self._loop.run()
+                return
+            except KeyboardInterrupt:
+                self.interrupt()
+                if self._state == "finished":
+                    return
+
+    def _finish(self):
+        """Stop, by quitting the main loop or calling on_finished."""
+        self._state = "finished"
+        if self._on_finished is not None:
+            self._on_finished(self)
+        else:
+            self._loop.quit()
 
+    @_with_own_typewriter
     def quit(self):
-        """Quit the main loop and print message."""
-        print('See you later!')
-        sys.exit(0)
+        """Quit the main loop and print message.
 
+        This returns from start(), rather than exiting from inside a
+        main loop callback, so that outstanding side effects and
+        sessions are dealt with on the way out.
+        """
+        default_typewriter().show('See you later!')
+        self._input.cancel()
+        self._finish()
+
+    def _internal_error(self, doing, error):
+        """Tell the user that something went wrong in doing and quit.
+
+        Only this state machine quits, so that others sharing the main
+        loop carry on.
+        """
+        self._abandon_attempt()
+        default_typewriter().show("Internal error in {}, {}".format(doing, error))
+        self.quit()
+
+    @_with_own_typewriter
+    def handle_session_failed(self, lesson, error):
+        """Give up, since lesson cannot be practised without a session."""
+        if self._state != "finished" and lesson == self._lesson:
+            self._internal_error("opening a session for {}".format(lesson),
+                                 error)
+
+    @_with_own_typewriter
     def handle_lessons_changed(self, *args):
-        """Handle lessons changing underneath us."""
+        """Handle lessons changing underneath us, by loading them again.
+
+        Everything that depends on the lessons is updated by
+        handle_lessons_reloaded. If the new lessons cannot be loaded,
+        there is nothing to carry on with, so quit.
+        """
         del args
 
-        print("Lessons changed - aborting")
-        self.quit()
+        # What the user has completed may have changed too, and so may
+        # the results of attempts
+        forget_known_tasks()
+        self._attempt_cache.clear()
+        if reload_lessons(self._lessons) is None:
+            default_typewriter().show("Lessons changed - aborting")
+            self.quit()
+
+    @_with_own_typewriter
+    @_quit_on_stale_lessons
+    def handle_lessons_reloaded(self, lessons, changed):
+        """Carry on with the lessons in changed added, removed or changed.
+
+        If the task that the user is at is still there, carry on with
+        it. If only the task has gone, go back to the entry of the
+        lesson. If the whole lesson has gone, quit.
+        """
+        self._attempt_cache.forget(changed)
+        self._completer.forget(changed)
+        if self._state == "finished" or self._lesson not in changed:
+            return
+
+        self._rendered.clear()
+        if self._lesson not in lessons:
+            self._abandon_attempt()
+            default_typewriter().show("Lessons changed - {} "
+                                      "is gone".format(self._lesson))
+            self.quit()
+            return
+
+        try:
+            lessons.task(self._lesson, self._task)
+        except KeyError:
+            pass
+        else:
+            if self._state == "waiting":
+                self._completer.move_to(self._lesson, self._task)
+                GLib.idle_add(self._prerender, self._lesson, self._task)
+            return
 
+        # A line might already be being read for the task which has
+        # gone, in which case it goes to the entry instead.
+        reading = self._state == "waiting"
+        showing = self._state != "fetching"
+        self._abandon_attempt()
+        self._initialize(self._lesson, lessons.lesson(self._lesson).entry)
+        if showing:
+            if reading:
+                # Move on from the prompt that is already showing
+                default_typewriter().show("")
+            default_typewriter().show("Lessons changed - going back to the "
+                                      "start of {}".format(self._lesson))
+            self.handle_task_description_fetched(lessons.task(self._lesson,
+                                                              self._task),
+                                                 read_input=not reading)
+
+    @_with_own_typewriter
+    @_quit_on_stale_lessons
     def lesson_events_satisfied(self, _, lesson, task):
         """Respond to events happening on lesson."""
         if (self._state == "waiting_lesson_events" and
             self._lesson == lesson and self._task == task):
-            self._state = "submit"
-            self._service.call_attempt_lesson_remote(self._session,
-                                                     self._lesson,
-                                                     self._task,
-                                                     "",
-                                                     None,
-                                                     self.handle_attempt_lesson_remote)
-
-    def handle_task_description_fetched(self, task_desc):
-        """Finish getting the task description and move to W."""
+            self._submit("")
+
+    def handle_task_description_fetched(self, task, read_input=True):
+        """Finish getting the Task and move to W.
+
+        If read_input is False, a line is already being read, so the
+        description is written straight away rather than typed out,
+        which would get in the way of what the user is typing.
+        """
         assert self._state == "fetching"
 
-        show_response_scrolled(task_desc["task"])
+        if read_input:
+            print_lines_slowly(self._render(task.description))
+        else:
+            default_typewriter().show(self._render(task.description))
         self._state = "waiting"
-        self.handle_user_input(display_input())
-
-    def handle_attempt_lesson_remote(self, source, result):
+        self._completer.move_to(self._lesson, self._task)
+        if read_input:
+            display_input(self._input, self.handle_user_input)
+        GLib.idle_add(self._prerender, self._lesson, self._task)
+
+    @_with_own_typewriter
+    @_quit_on_stale_lessons
+    def handle_attempt_lesson_remote(self, source, result, attempt, call_id):
         """Finish handling the lesson and move to F or E."""
-        assert self._state == "submit"
+        del source
 
         try:
             attempt_result_json = self._service.call_attempt_lesson_remote_finish(result)
+        except GLib.Error as error:
+            attempt_result_json = None
+            failure = error
         except Exception as error:
-            raise SystemExit("Internal error in attempting {}, {}\n".format(self._task,
-                                                                            error))
+            if attempt is self._attempt:
+                self._internal_error("attempting {}".format(attempt.task), error)
+            return
+
+        # The call was given up on, so this reply is not wanted any more
+        if attempt is not self._attempt or attempt.call_id != call_id:
+            return
+
+        assert self._state == "submit"
+
+        if attempt_result_json is None:
+            self._attempt_failed(attempt, failure.message)
+            return
+
+        self._end_call(attempt)
+        self._attempt = None
+        self._hide_progress()
 
-        # Look up the response in the lessons descriptor and see if there is a next task
         attempt_result = json.loads(attempt_result_json)
-        result = attempt_result["result"]
-        responses = attempt_result["responses"]
-        result_desc = find_task_json(self._lessons, self._lesson, self._task)["effects"][result]
-        next_task_id = result_desc.get("move_to", self._task)
-        completes_lesson = result_desc.get("completes_lesson", False)
+        if self._lessons.is_deterministic(attempt.lesson, attempt.task):
+            self._attempt_cache.put(attempt.lesson,
+                                    attempt.task,
+                                    attempt.user_input,
+                                    attempt_result["result"],
+                                    attempt_result["responses"])
+
+        self.handle_attempt_result(attempt_result["result"],
+                                   attempt_result["responses"])
+
+    def handle_attempt_result(self, result, responses):
+        """Show the outcome of an attempt and move to F or E."""
+        assert self._state == "submit"
+
+        # Look up the effect of the result and see if there is a next task
+        transition = self._lessons.transition(self._lesson, self._task, result)
+        if self._on_attempt is not None:
+            user_input, submitted_at = self._submitted
+            self._on_attempt(self._lesson,
+                             self._task,
+                             user_input,
+                             result,
+                             transition,
+                             time.time() - submitted_at)
+        next_task_id = transition.move_to
+        completes_lesson = transition.completes_lesson
 
         # Print any relevant responses, wrapped
         for response in responses:
             show_response(response)
 
         # Print the reply
-        show_response_scrolled(result_desc["reply"])
+        print_lines_slowly(self._render(transition.reply))
 
-        # Do any side effects now if they are present
+        # Queue any side effects now if they are present. They are
+        # dispatched in the background, so we don't wait for them.
         self._state = "running_side_effects"
-        side_effects = result_desc.get("side_effects", list())
-        for side_effect in side_effects:
-            dispatch_side_effect(side_effect, self._coding_game_service)
+        for side_effect in transition.side_effects:
+            self._side_effects.push(side_effect)
 
         # Regardless of what the lesson is, fire this event so that
         # the game service can know that *a* task completed.
-        dispatch_side_effect({
-            "type": "event",
-            "value": "showmehow-task-completed"
-        }, self._coding_game_service)
+        self._side_effects.push(_TASK_COMPLETED)
 
         if completes_lesson:
-            self._loop.quit()
+            add_known_task(self._lesson)
+            if self._checkpoint:
+                clear_checkpoint()
+            self._finish()
         elif next_task_id == self._task:
             self._state = "waiting"
-            self.handle_user_input(display_input())
+            display_input(self._input, self.handle_user_input)
         else:
             self._state = "fetching"
             self._task = next_task_id
+            if self._checkpoint:
+                write_checkpoint(self._lesson, self._task)
             self._show_next_task()
 
+    def handle_side_effect_dispatched(self, effect, error):
+        """Report side effects that could not be dispatched."""
+        if error is not None:
+            sys.stderr.write("Could not dispatch {}: {}\n".format(effect.value,
+                                                                 error))
+
+    @_with_own_typewriter
+    @_quit_on_stale_lessons
     def handle_user_input(self, user_input):
         """Handle user input from readline."""
 
-        # If it is 'quit' or 'exit', exit showmehow
-        if user_input in ('quit', 'exit'):
+        # If it is 'quit' or 'exit', or the input ended, exit showmehow
+        if user_input is None or user_input in ('quit', 'exit'):
             self.quit()
             return
 
@@ -363,15 +1134,20 @@ class PracticeTaskStateMachine(object):
         # give the impression that we're going back to the top level
         if user_input.strip() == "showmehow" and self._lesson != "info":
             show_response_scrolled("Having fun? You can do the following tasks:")
-            show_tasks(get_unlocked_tasks(self._lessons))
+            show_tasks(self._unlocked_tasks)
             self.quit()
             return
 
-        # If the user types 'showmehow X' we should go to that task.
-        if user_input.startswith("showmehow") and self._lesson != "info":
-            _, requested_lesson = re.split(r"\s+", user_input, maxsplit=1)
-            lesson, task = find_task_or_report_error(get_unlocked_tasks(self._lessons),
-                                                     requested_lesson)
+        # If the user types 'showmehow X' we should go to that task, or
+        # stay on this one if there is no task X.
+        words = user_input.split(None, 1)
+        if words[:1] == ["showmehow"] and self._lesson != "info":
+            lesson, task = find_task_or_report_error(self._unlocked_tasks,
+                                                     words[1])
+            if lesson is None:
+                display_input(self._input, self.handle_user_input)
+                return
+
             self._initialize(lesson, task)
 
             # Display content for the entry point
@@ -379,165 +1155,334 @@ class PracticeTaskStateMachine(object):
             return
 
         # Submit this to the service and wait for the result
-        self._state = "submit"
-        self._service.call_attempt_lesson_remote(self._session,
-                                                 self._lesson,
-                                                 self._task,
-                                                 user_input,
-                                                 None,
-                                                 self.handle_attempt_lesson_remote)
+        self._submit(user_input)
         return True
 
 
-def print_name_detail_pair(task):
-    """Given a task tuple, print a name and detail pair."""
-    print("    [{task[0]}] - {task[1]}".format(task=task))
+def print_name_detail_pair(lesson):
+    """Given a Lesson, print its name and description."""
+    default_typewriter().show("    [{}] - {}".format(lesson.name, lesson.desc))
+
+
+_LEVEL_HEADINGS = (
+    ("beginner", "For beginners:"),
+    ("intermediate", "If you're a little more confident:"),
+    ("advanced", "If you're ready for a challenge:")
+)
+
 
 def show_tasks(tasks):
     """Show tasks that can be done in the terminal."""
-    print_lines_slowly(in_blue("For beginners:"))
-    for task in tasks:
-        if task[3] == "beginner":
+    for level, heading in _LEVEL_HEADINGS:
+        print_lines_slowly(in_blue(heading))
+        for task in tasks.at_level(level):
             print_name_detail_pair(task)
 
-    print_lines_slowly(in_blue("If you're a little more confident:"))
-    for task in tasks:
-        if task[3] == "intermediate":
-            print_name_detail_pair(task)
+    print_lines_slowly(in_blue("To run any of these lessons, simply enter the command’s name. For example, you could type ‘showmehow breakit’ or 'showmehow navigation' (without the quotation marks) and then hit enter."))
 
-    print_lines_slowly(in_blue("If you're ready for a challenge:"))
-    for task in tasks:
-        if task[3] == "advanced":
-            print_name_detail_pair(task)
 
-    print_lines_slowly(in_blue("To run any of these lessons, simply enter the command’s name. For example, you could type ‘showmehow breakit’ or 'showmehow navigation' (without the quotation marks) and then hit enter."))
+class ServiceProxiesLoader(object):
+    """Construct the service proxies concurrently.
+
+    Both proxies are constructed asynchronously as soon as this object
+    is created, and the service warnings are fetched as soon as the
+    ShowmehowService proxy is ready. Activating the services on the
+    session bus takes a while, so the caller can get on with other work
+    in the meantime, calling poll() to let the construction progress,
+    and then call wait() to get the proxies.
+    """
+
+    def __init__(self):
+        """Start constructing both proxies."""
+        super(ServiceProxiesLoader, self).__init__()
+
+        self._loop = GLib.MainLoop()
+        self._pending = 3
+        self._error = None
+        self._service = None
+        self._coding_game_service = None
+
+        Showmehow.ServiceProxy.new_for_bus(Gio.BusType.SESSION,
+                                           0,
+                                           "com.endlessm.ShowmehowService",
+                                           "/com/endlessm/ShowmehowService",
+                                           None,
+                                           self._on_service_ready)
+        CodingGameService.CodingGameServiceProxy.new_for_bus(Gio.BusType.SESSION,
+                                                             0,
+                                                             "com.endlessm.CodingGameService",
+                                                             "/com/endlessm/CodingGameService",
+                                                             None,
+                                                             self._on_coding_game_service_ready)
+
+    def _finished_one(self):
+        """Note that one of the pending operations finished."""
+        self._pending -= 1
+        if self._pending == 0:
+            self._loop.quit()
+
+    def _on_service_ready(self, source, result):
+        """Finish constructing ShowmehowService and fetch its warnings."""
+        del source
+
+        try:
+            self._service = Showmehow.ServiceProxy.new_for_bus_finish(result)
+        except GLib.Error as error:
+            self._error = error
+            self._pending -= 1
+        else:
+            self._service.call_get_warnings(None, self._on_warnings_fetched)
+
+        self._finished_one()
+
+    def _on_warnings_fetched(self, source, result):
+        """Display any warnings that came through from the service."""
+        del source
+
+        try:
+            for warning in self._service.call_get_warnings_finish(result):
+                sys.stderr.write("Service warning: {}\n".format(warning[0]))
+        except GLib.Error as error:
+            self._error = error
+
+        self._finished_one()
+
+    def _on_coding_game_service_ready(self, source, result):
+        """Finish constructing CodingGameService."""
+        del source
+
+        try:
+            self._coding_game_service = \
+                CodingGameService.CodingGameServiceProxy.new_for_bus_finish(result)
+        except GLib.Error as error:
+            self._error = error
+
+        self._finished_one()
+
+    def poll(self):
+        """Dispatch anything that is ready without blocking.
 
-def create_service():
-    """Create a ShowmehowService."""
-    service = Showmehow.ServiceProxy.new_for_bus_sync(Gio.BusType.SESSION,
-                                                      0,
-                                                      "com.endlessm.ShowmehowService",
-                                                      "/com/endlessm/ShowmehowService")
-    # Display any warnings that came through from the service.
-    for warning in service.call_get_warnings_sync():
-        sys.stderr.write("Service warning: {}\n".format(warning[0]))
+        Constructing a proxy takes several steps, each of which is started
+        from the completion of the last, so this lets construction carry
+        on while the caller is busy with something else.
+        """
+        context = GLib.MainContext.default()
+        while self._pending and context.iteration(False):
+            pass
+
+    def wait(self):
+        """Wait until both proxies are ready and return them.
+
+        Raises the first error that occurred while constructing them.
+        """
+        if self._pending:
+            self._loop.run()
 
-    return service
+        if self._error is not None:
+            raise self._error
 
+        return (self._service, self._coding_game_service)
 
-def create_coding_game_service():
-    """Create a CodingGameService Proxy instance."""
-    return CodingGameService.CodingGameServiceProxy.new_for_bus_sync(Gio.BusType.SESSION,
-                                                                     0,
-                                                                     "com.endlessm.CodingGameService",
-                                                                     "/com/endlessm/CodingGameService")
 
 def noninteractive_predefined_script(arguments):
     """Script to follow if we are non-interactive.
 
-    This does not create a service instance. Instead, it just gives
-    two canned responses depending on the arguments.
+    This does not create a service instance. Instead, it gives one of
+    two responses depending on the arguments.
 
-    If no arguments are given, show a mock response for what unlocked_tasks
-    would be.
+    If no arguments are given, show the unlocked tasks.
 
-    If an argument is given, show a mock response for what "showmehow info"
-    would do.
+    If an argument is given, show what "showmehow info" would do: the
+    first task of the info lesson, and the reply to typing 'showmehow'.
+    That task has local matchers, so the reply is looked up without
+    the service.
 
     The reason we have this is that we cannot connect to the service
-    within a child process of the service - that just hangs. We only care
-    about specific canned responses, so just use those.
+    within a child process of the service - that just hangs.
     """
+    lessons = load_lessons()
     if not arguments.task:
         print("Hey, how are you? I can tell you about the following tasks:\n")
-        show_tasks(get_unlocked_tasks(load_lessons()))
+        show_tasks(UnlockedTaskIndex(lessons))
     else:
-        task_desc = "'showmehow' is a command that you can type, just like any other command. Try typing it and see what happens."
-        success_text = "You can run any of those tasks at anytime, simply enter the showmehow command followed by the task name. This is called an 'argument'. An 'argument' comes after the program name. The program will read them to determine what to do. For example, you could type ‘showmehow breakit’ or 'showmehow navigation' (without the quotation marks) and then hit enter. Try this: 'showmehow breakit'."
-        print(task_desc)
-        print(success_text)
+        task = lessons.lesson("info").entry
+        result = lessons.local_result("info", task, "showmehow")
+        print(lessons.task("info", task).description)
+        print(lessons.transition("info", task, result).reply)
+
+
+def load_lessons():
+    """Load the compiled lesson catalog for lessons.json."""
+    return load_catalog(os.path.join(os.path.dirname(__file__), 'lessons.json'))
 
 
-def print_banner():
-    """Print a small banner informing the user how to continue.
+def reload_lessons(lessons):
+    """Load lessons.json again and update the catalog lessons in place.
 
-    However, we don't want to print this banner if we have already run.
+    Whatever is connected to the catalog is told which lessons changed.
+    Returns the set of their names, or None if the lessons could not be
+    loaded, in which case lessons is left as it was.
+    """
+    try:
+        with TRACE.span("lessons.reload"):
+            return lessons.update(load_lessons())
+    except (LessonValidationError, EnvironmentError, ValueError) as error:
+        sys.stderr.write("Could not load the changed lessons: {}\n".format(error))
+        return None
+
+
+class TaskIndex(object):
+    """Index of tasks, by name and by level.
+
+    Each task is the Lesson of that name. Only lessons which are in the
+    catalog are included. The names of the tasks are also kept in a
+    PrefixTrie, completions, for completing them at the prompt. When the
+    catalog is reloaded, only the tasks for lessons which changed are
+    updated.
     """
-    first_run_file = os.path.join(GLib.get_user_config_dir(), 'com.endlessm.Showmehow', '.first-run')
-    if os.path.exists(first_run_file):
-        return
 
-    # Write the file - it is okay if the containing directory exists
+    def __init__(self, lessons, names):
+        """Build the index for the lessons called names."""
+        super(TaskIndex, self).__init__()
+
+        self._lessons = lessons
+        self._names = []
+        self._by_name = OrderedDict()
+        self._by_level = {level: [] for level in LEVELS}
+        self._update(names)
+        lessons.connect_reloaded(self._on_lessons_reloaded)
+
+    def _update(self, names):
+        """Add and remove tasks so that the index matches names."""
+        self._names = list(names)
+        included = set(name for name in names if name in self._lessons)
+
+        for name in [name for name in self._by_name if name not in included]:
+            lesson = self._by_name.pop(name)
+            self._by_level[lesson.level].remove(lesson)
+
+        for name in names:
+            if name in included and name not in self._by_name:
+                lesson = self._lessons.lesson(name)
+                self._by_name[name] = lesson
+                self._by_level[lesson.level].append(lesson)
+
+        self.completions = PrefixTrie(self._by_name)
+
+    def _on_lessons_reloaded(self, lessons, changed):
+        """Update the tasks for the lessons in changed, keeping their order."""
+        for name in changed:
+            old = self._by_name.get(name)
+            if old is None or name not in lessons:
+                continue
+
+            new = self._by_name[name] = lessons.lesson(name)
+            tasks = self._by_level[old.level]
+            if new.level == old.level:
+                tasks[tasks.index(old)] = new
+            else:
+                tasks.remove(old)
+                self._by_level[new.level].append(new)
+
+        # Add lessons which appeared and remove those which went away
+        self._update(self._names)
+
+    def __iter__(self):
+        """Iterate over tasks in the order they were added."""
+        return iter(self._by_name.values())
+
+    def __len__(self):
+        """Return the number of tasks."""
+        return len(self._by_name)
+
+    def find(self, name):
+        """Get the Lesson for the task called name, or None."""
+        return self._by_name.get(name)
+
+    def at_level(self, level):
+        """Get the tasks at level."""
+        return self._by_level[level]
+
+
+class UnlockedTaskIndex(TaskIndex):
+    """Index of the unlocked tasks.
+
+    The index is built once from the unlocked-lessons key and then kept
+    up to date incrementally as lessons are unlocked or locked again,
+    so looking up and listing tasks never has to go back to GSettings.
+    """
+
+    def __init__(self, lessons, settings=None):
+        """Build the index and start watching for changes."""
+        self._settings = settings or Gio.Settings.new('com.endlessm.showmehow')
+        super(UnlockedTaskIndex, self).__init__(
+            lessons,
+            self._settings.get_value('unlocked-lessons')
+        )
+        self._settings.connect('changed::unlocked-lessons',
+                               self._on_unlocked_lessons_changed)
+
+    def _update(self, names):
+        """Add and remove tasks so that the index matches names."""
+        super(UnlockedTaskIndex, self)._update(names)
+
+        # Keep the list used by tab completion up to date while we are here
+        write_unlocked_names(list(self._by_name))
+
+    def _on_unlocked_lessons_changed(self, settings, key):
+        """Update the index for a change in unlocked lessons."""
+        self._update(settings.get_value(key))
+
+
+def find_resume_task(lessons, lesson, entry):
+    """Get the task to start lesson at.
+
+    That is where the user left off if the progress checkpoint is in
+    lesson, or entry otherwise.
+    """
+    checkpoint = read_checkpoint()
+    if checkpoint is None or checkpoint[0] != lesson:
+        return entry
+
     try:
-        os.makedirs(os.path.dirname(first_run_file))
-    except OSError as error:
-        if error.errno != errno.EEXIST:
-            raise error
-
-    with open(first_run_file, 'w') as fileobj:
-        fileobj.write('')
-
-    print("""[STATUS] Loading""")
-    time.sleep(0.2)
-    print("""[STATUS] Fetching content""")
-    time.sleep(0.4)
-    print("""[STATUS] Transforming system""")
-    time.sleep(0.1)
-    print("""[DONE]\n\n"""
-          """Welcome to 'showmehow'!\n"""
-          """\n""",
-          """We'll show you what's behind the curtains on your system.\n"""
-          """\n"""
-          """To exit at any time, type 'exit' or 'quit' and press 'enter'.\n"""
-          """Have a lot of fun!\n"""
-          """\n\n""")
+        lessons.task(lesson, checkpoint[1])
+    except KeyError:
+        # The task went away when the lessons changed
+        return entry
+    except StaleCatalogError:
+        # Starting at entry, the state machine finds this out for itself
+        return entry
 
+    return checkpoint[1]
 
-def load_lessons():
-    """Load lessons from the specified JSON file."""
-    lessons_path = os.path.join(os.path.dirname(__file__), 'lessons.json')
-    with open(lessons_path) as lessons_stream:
-        return json.load(lessons_stream)
-
-
-UnlockedTaskDetail = namedtuple("UnlockedTaskDetail", "desc entry level")
-
-def get_unlocked_tasks(lessons):
-    """Get available tasks."""
-    task_name_detail_pairs = {
-        l["name"]: UnlockedTaskDetail(l["desc"], l["entry"], l["level"])
-        for l in lessons
-    }
-
-    settings = Gio.Settings.new('com.endlessm.showmehow')
-    return [
-        [
-            t,
-            task_name_detail_pairs[t].desc,
-            task_name_detail_pairs[t].entry,
-            task_name_detail_pairs[t].level
-        ]
-        for t in settings.get_value('unlocked-lessons')
-        if t in task_name_detail_pairs
-    ]
+
+def pick_up_task(lessons, lesson, entry):
+    """Get the task to start lesson at, telling the user if they left off there."""
+    resume_task = find_resume_task(lessons, lesson, entry)
+    if resume_task != entry:
+        show_response_scrolled("Picking up where you left off. "
+                               "Use --restart to start from the beginning.")
+
+    return resume_task
 
 
 def find_task_or_report_error(unlocked_tasks, requested_task):
     """Attempt to find requested_task in unlocked_tasks or report an error."""
-    try:
-        task, desc, entry, level = [
-            t for t in unlocked_tasks if t[0] == requested_task
-        ][0]
-        return (task, entry)
-    except IndexError:
-        if requested_task:
-            show_response_scrolled("I don't know how to do task {}".format(requested_task))
-        elif len(unlocked_tasks) == 0:
-            show_response_scrolled("I can't show you anything right now, sorry.")
-        else:
-            show_response_scrolled("Hey, how are you? I can tell you about the following tasks:")
-        show_tasks(unlocked_tasks)
-        return (None, None)
+    task = unlocked_tasks.find(requested_task)
+    if task is not None:
+        return (task.name, task.entry)
+
+    if requested_task:
+        show_response_scrolled("I don't know how to do task {}".format(requested_task))
+    elif len(unlocked_tasks) == 0:
+        show_response_scrolled("I can't show you anything right now, sorry.")
+    else:
+        show_response_scrolled("Hey, how are you? I can tell you about the following tasks:")
+    show_tasks(unlocked_tasks)
+    return (None, None)
+
+
+STARTUP.mark("import")
 
 
 def main(argv=None):
@@ -551,28 +1496,100 @@ def main(argv=None):
     parser.add_argument('--list',
                         help='Display list of known commands',
                         action='store_true')
+    parser.add_argument('--restart',
+                        help='Start TASK from the beginning, rather than '
+                             'where you left off',
+                        action='store_true')
+    parser.add_argument('--profile-startup',
+                        help='Report how long each phase of startup takes',
+                        action='store_true')
+    parser.add_argument('--trace',
+                        metavar='FILE',
+                        help='Record how long each operation takes to FILE')
+    parser.add_argument('--script',
+                        metavar='FILE',
+                        help='Run the attempts in the JSON script FILE (- for '
+                             'standard input) and write the results as JSON lines')
+    parser.add_argument('--jobs',
+                        metavar='N',
+                        type=int,
+                        default=4,
+                        help='How many runs in a script to do at once')
+    parser.add_argument('--attempt-timeout',
+                        metavar='SECS',
+                        type=float,
+                        default=DEFAULT_ATTEMPT_POLICY.timeout,
+                        help='How long to wait for the service to check an '
+                             'attempt (default: %(default)s)')
+    parser.add_argument('--attempt-retries',
+                        metavar='N',
+                        type=int,
+                        default=DEFAULT_ATTEMPT_POLICY.retries,
+                        help='How many times to try checking an attempt again '
+                             'if the service fails to, at tasks marked '
+                             'deterministic')
     arguments = parser.parse_args(argv or sys.argv[1:])
-    lessons = load_lessons()
+    if arguments.trace:
+        TRACE.enable(arguments.trace)
+    if arguments.profile_startup:
+        STARTUP.enable()
+    STARTUP.mark("parse arguments")
 
     if os.environ.get("NONINTERACTIVE"):
         return noninteractive_predefined_script(arguments)
-    else:
-        service = create_service()
-        coding_game_service = create_coding_game_service()
-        unlocked_tasks = get_unlocked_tasks(lessons)
 
+    # Listing tasks does not need the services, so don't create them
     if arguments.list:
-        for t in unlocked_tasks:
-            print(t[0])
+        for t in UnlockedTaskIndex(load_lessons()):
+            print(t.name)
         sys.exit(0)
 
+    # Activating the services is the slowest part of starting up, so
+    # get that going first and load everything else while it happens.
+    proxies = ServiceProxiesLoader()
+    STARTUP.mark("start creating services")
+
+    lessons = load_lessons()
+    proxies.poll()
+    STARTUP.mark("load lessons")
+
+    unlocked_tasks = UnlockedTaskIndex(lessons)
+    proxies.poll()
+    STARTUP.mark("unlocked tasks")
+
+    service, coding_game_service = proxies.wait()
+    STARTUP.mark("wait for services")
+
+    if arguments.script:
+        from showmehow.script import run_script
+        return run_script(arguments.script,
+                          service,
+                          coding_game_service,
+                          lessons,
+                          unlocked_tasks,
+                          max(arguments.jobs, 1))
+
     # Only print the banner when showmehow is actually useful
     if len(unlocked_tasks) != 0:
         print_banner()
+        STARTUP.mark("banner")
 
     task, entry = find_task_or_report_error(unlocked_tasks, arguments.task)
     if not task or not entry:
         return
 
-    with PracticeTaskStateMachine(service, coding_game_service, lessons, task, entry) as machine:
+    if not arguments.restart:
+        entry = pick_up_task(lessons, task, entry)
+
+    with PracticeTaskStateMachine(service,
+                                  coding_game_service,
+                                  lessons,
+                                  task,
+                                  entry,
+                                  unlocked_tasks=unlocked_tasks,
+                                  checkpoint=True,
+                                  attempt_policy=DEFAULT_ATTEMPT_POLICY._replace(
+                                      timeout=arguments.attempt_timeout,
+                                      retries=max(arguments.attempt_retries, 0)
+                                  )) as machine:
         machine.start()
@@ -0,0 +1,218 @@
+# /showmehow/tracing.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - tracing of operations on the hot path
+"""Spans recording how long each operation in a session takes.
+
+Set SHOWMEHOW_TRACE=FILE or pass --trace FILE to record a span for each
+attempt round trip, side effect dispatch, session open and close, lesson
+load and piece of typewriter output. The spans are written to FILE on
+exit, in the Chrome trace event format if FILE ends in .json, so that it
+can be loaded into chrome://tracing, or as JSON lines otherwise.
+
+Summarise one or more trace files, in either format, with:
+
+    python -m showmehow.tracing FILE [FILE...]
+"""
+
+import atexit
+import json
+import os
+import sys
+import time
+
+from collections import defaultdict
+
+
+class _Span(object):
+    """Context manager which records a span around its body."""
+
+    def __init__(self, tracer, name, args):
+        """Initialise with the tracer, span name and arguments."""
+        super(_Span, self).__init__()
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._token = None
+
+    def __enter__(self):
+        """Begin the span."""
+        self._token = self._tracer.begin(self._name, **self._args)
+        return self
+
+    def __exit__(self, exc_type, value, traceback):
+        """End the span."""
+        del exc_type
+        del value
+        del traceback
+
+        self._tracer.end(self._token)
+
+
+class Tracer(object):
+    """Record spans and write them out when showmehow exits.
+
+    Operations which finish in a callback are recorded by passing the
+    token returned by begin() to end(). Synchronous ones can use span()
+    as a context manager instead. Both do nothing unless enabled.
+    """
+
+    def __init__(self):
+        """Initialise, enabling tracing from the environment."""
+        super(Tracer, self).__init__()
+        self._spans = []
+        self._path = None
+        self.enabled = False
+
+        if os.environ.get("SHOWMEHOW_TRACE"):
+            self.enable(os.environ["SHOWMEHOW_TRACE"])
+
+    def enable(self, path):
+        """Enable tracing and write the spans to path on exit."""
+        if not self.enabled:
+            atexit.register(self.finish)
+
+        self.enabled = True
+        self._path = path
+
+    def begin(self, name, **args):
+        """Begin a span called name, returning a token to pass to end()."""
+        if not self.enabled:
+            return None
+
+        return (name, time.time(), args)
+
+    def end(self, token):
+        """End the span for token, which may be None."""
+        if token is None:
+            return
+
+        name, start, args = token
+        self._spans.append((name, start, time.time() - start, args))
+
+    def span(self, name, **args):
+        """Get a context manager which records a span called name."""
+        return _Span(self, name, args)
+
+    def finish(self):
+        """Write the spans recorded so far, once."""
+        if not self.enabled or self._path is None:
+            return
+
+        path, self._path = self._path, None
+        try:
+            with open(path, "w") as stream:
+                if path.endswith(".json"):
+                    _write_chrome_trace(self._spans, stream)
+                else:
+                    _write_json_lines(self._spans, stream)
+        except (IOError, OSError) as error:
+            sys.stderr.write("Could not write trace to {}: {}\n".format(path,
+                                                                       error))
+
+
+def _write_json_lines(spans, stream):
+    """Write spans to stream with one JSON object per line."""
+    for name, start, duration, args in spans:
+        stream.write(json.dumps({
+            "name": name,
+            "ts": int(start * 1000000),
+            "dur": int(duration * 1000000),
+            "args": args
+        }) + "\n")
+
+
+def _write_chrome_trace(spans, stream):
+    """Write spans to stream as Chrome trace events."""
+    pid = os.getpid()
+    json.dump({
+        "traceEvents": [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": int(start * 1000000),
+                "dur": int(duration * 1000000),
+                "pid": pid,
+                "tid": 0,
+                "args": args
+            }
+            for name, start, duration, args in spans
+        ]
+    }, stream)
+
+
+def read_trace(path):
+    """Read the (name, duration) of each span in the trace at path.
+
+    Durations are in seconds. Both output formats are understood.
+    """
+    with open(path) as stream:
+        contents = stream.read()
+
+    try:
+        trace = json.loads(contents)
+    except ValueError:
+        trace = None
+
+    if isinstance(trace, dict) and "traceEvents" in trace:
+        events = [event for event in trace["traceEvents"] if event.get("ph") == "X"]
+    else:
+        events = [json.loads(line) for line in contents.splitlines() if line.strip()]
+
+    return [(event["name"], event["dur"] / 1000000.0) for event in events]
+
+
+def _percentile(samples, fraction):
+    """Get the sample at fraction of the way through sorted samples."""
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize(spans, stream=None):
+    """Write the count, p50, p95 and maximum duration of each kind of span."""
+    stream = stream or sys.stdout
+    durations = defaultdict(list)
+    for name, duration in spans:
+        durations[name].append(duration)
+
+    stream.write("{:<24} {:>8} {:>10} {:>10} {:>10}\n".format("operation",
+                                                              "count",
+                                                              "p50 (ms)",
+                                                              "p95 (ms)",
+                                                              "max (ms)"))
+    for name in sorted(durations):
+        samples = durations[name]
+        stream.write("{:<24} {:>8} {:>10.2f} {:>10.2f} {:>10.2f}\n".format(
+            name,
+            len(samples),
+            _percentile(samples, 0.5) * 1000,
+            _percentile(samples, 0.95) * 1000,
+            max(samples) * 1000
+        ))
+
+
+def main(argv=None):
+    """Summarise trace files."""
+    import argparse
+
+    parser = argparse.ArgumentParser("Summarise showmehow traces")
+    parser.add_argument("traces", nargs="+", metavar="FILE")
+    arguments = parser.parse_args(argv or sys.argv[1:])
+
+    # Don't overwrite a trace named by SHOWMEHOW_TRACE while reading it
+    TRACE.enabled = False
+
+    spans = []
+    for path in arguments.traces:
+        spans.extend(read_trace(path))
+
+    summarize(spans)
+    return 0
+
+
+TRACE = Tracer()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+# /showmehow/typewriter.py
+#
+# Copyright (c) 2017 Endless Mobile Inc.
+#
+# showmehow - typewriter text rendering
+"""Render text as though it were being typed out.
+
+Writing and flushing one character at a time, with a sleep after each,
+costs a system call and a wakeup per character. Instead, text is split
+ahead of time into frames of characters which add up to at least one
+frame interval of delay, and each frame is written in one go. Pressing
+a key while text is being typed out shows the rest of it straight away.
+"""
+
+import contextlib
+import os
+import select
+import sys
+import time
+
+from showmehow.tracing import TRACE
+
+
+_PAUSECHARS = ".?!:"
+
+# How long to pause after a character which is followed by a space,
+# with CHARACTER_DELAY for everything else.
+PAUSE_DELAYS = dict((char, 0.5) for char in _PAUSECHARS)
+CHARACTER_DELAY = 0.02
+
+# 20 frames per second, which is three characters per frame.
+FRAME_INTERVAL = 0.05
+
+
+_STDOUT_IS_TTY = None
+
+
+def stdout_is_tty():
+    """Return True if standard output is a terminal, checking only once."""
+    global _STDOUT_IS_TTY  # pylint: disable=global-statement
+
+    if _STDOUT_IS_TTY is None:
+        _STDOUT_IS_TTY = sys.stdout.isatty()
+
+    return _STDOUT_IS_TTY
+
+
+_TERMINAL_WIDTH = None
+
+
+def terminal_width():
+    """Return the width of the terminal on standard output, checking only once.
+
+    If standard output is not a terminal, this is 80.
+    """
+    global _TERMINAL_WIDTH  # pylint: disable=global-statement
+
+    if _TERMINAL_WIDTH is None:
+        _TERMINAL_WIDTH = 80
+        if stdout_is_tty():
+            try:
+                import fcntl
+                import struct
+                import termios
+
+                _, columns = struct.unpack("hh", fcntl.ioctl(sys.stdout.fileno(),
+                                                             termios.TIOCGWINSZ,
+                                                             b"\0" * 4))
+                if columns > 0:
+                    _TERMINAL_WIDTH = columns
+            except (ImportError, IOError, OSError):
+                pass
+
+    return _TERMINAL_WIDTH
+
+
+def compile_frames(text, frame_interval=FRAME_INTERVAL):
+    """Split text into a list of (chunk, delay) frames.
+
+    Each chunk is written at once and followed by delay seconds of
+    waiting, which is the total delay of the characters in the chunk.
+    """
+    frames = []
+    start = 0
+    pending = 0.0
+    last = len(text) - 1
+
+    for index, char in enumerate(text):
+        if char in PAUSE_DELAYS and index < last and text[index + 1] == " ":
+            pending += PAUSE_DELAYS[char]
+        else:
+            pending += CHARACTER_DELAY
+
+        if pending >= frame_interval:
+            frames.append((text[start:index + 1], pending))
+            start = index + 1
+            pending = 0.0
+
+    if start < len(text):
+        frames.append((text[start:], pending))
+
+    return frames
+
+
+def _sleep(delay):
+    """Wait for delay seconds. The wait is never skipped."""
+    time.sleep(delay)
+    return False
+
+
+class _KeypressWaiter(object):
+    """Wait for a delay, returning early if a key is pressed.
+
+    While in use, the terminal is put into cbreak mode so that a single
+    keypress can be read without waiting for enter.
+    """
+
+    def __init__(self, fd):
+        """Initialise with the terminal file descriptor."""
+        super(_KeypressWaiter, self).__init__()
+        self._fd = fd
+        self._attributes = None
+
+    def __enter__(self):
+        """Put the terminal into cbreak mode."""
+        import termios
+        import tty
+
+        self._attributes = termios.tcgetattr(self._fd)
+        tty.setcbreak(self._fd)
+        return self
+
+    def __exit__(self, exc_type, value, traceback):
+        """Restore the terminal."""
+        del exc_type
+        del value
+        del traceback
+
+        import termios
+        termios.tcsetattr(self._fd, termios.TCSADRAIN, self._attributes)
+
+    def __call__(self, delay):
+        """Wait for delay seconds, returning True if a key was pressed."""
+        readable, _, _ = select.select([self._fd], [], [], delay)
+        if readable:
+            os.read(self._fd, 1)
+            return True
+
+        return False
+
+
+class _NoKeypressWaiter(object):
+    """Wait for a delay with a plain function, never skipping."""
+
+    def __init__(self, wait):
+        """Initialise with the function which waits."""
+        super(_NoKeypressWaiter, self).__init__()
+        self._wait = wait
+
+    def __enter__(self):
+        """Return the wait function."""
+        return self._wait
+
+    def __exit__(self, exc_type, value, traceback):
+        """Nothing to clean up."""
+        del exc_type
+        del value
+        del traceback
+
+
+class Typewriter(object):
+    """Write text to a stream as though it were being typed.
+
+    If wait is given, it is called with each delay, and returns True to
+    skip the rest of the text. Otherwise, delays are skipped by pressing
+    a key if standard input is a terminal. If animate is False, text is
+    written straight away.
+
+    colour and width say whether text should be coloured and how wide
+    to wrap it. If they are None, that depends on standard output.
+    """
+
+    def __init__(self, stream=None, wait=None, animate=True,
+                 frame_interval=FRAME_INTERVAL, colour=None, width=None):
+        """Initialise the typewriter."""
+        super(Typewriter, self).__init__()
+
+        self._stream = stream or sys.stdout
+        self._wait = wait
+        self._animate = animate
+        self._frame_interval = frame_interval
+        self.colour = colour
+        self.width = width
+
+    def _waiter(self):
+        """Get a context manager for the function to wait with."""
+        if self._wait is not None:
+            return _NoKeypressWaiter(self._wait)
+
+        try:
+            if sys.stdin.isatty():
+                return _KeypressWaiter(sys.stdin.fileno())
+        except (AttributeError, ValueError):
+            pass
+
+        return _NoKeypressWaiter(_sleep)
+
+    def show(self, text):
+        """Write text and a newline straight away."""
+        self._stream.write(text + "\n")
+        self._stream.flush()
+
+    def write(self, text, newline=True):
+        """Type out text, followed by a newline if newline is True."""
+        with TRACE.span("typewriter.write", characters=len(text)):
+            self._write(text, newline)
+
+    def _write(self, text, newline):
+        """Type out text, without tracing."""
+        if not self._animate:
+            self._stream.write(text + "\n" if newline else text)
+            self._stream.flush()
+            return
+
+        frames = compile_frames(text + " ", self._frame_interval)
+        with self._waiter() as wait:
+            for index, (chunk, delay) in enumerate(frames):
+                self._stream.write(chunk)
+                self._stream.flush()
+                if wait(delay):
+                    self._stream.write("".join(rest for rest, _ in
+                                               frames[index + 1:]))
+                    break
+
+        if newline:
+            self._stream.write("\n")
+        self._stream.flush()
+
+    def pause(self, delay):
+        """Wait for delay seconds, returning True if a key skipped the wait."""
+        if not self._animate:
+            return False
+
+        with self._waiter() as wait:
+            return wait(delay)
+
+    def dots(self, count, interval=1):
+        """Write count dots, interval seconds apart, skippable by a key."""
+        with TRACE.span("typewriter.dots", count=count):
+            self._dots(count, interval)
+
+    def _dots(self, count, interval):
+        """Write count dots, without tracing."""
+        if not self._animate:
+            self._stream.write("." * count)
+            self._stream.flush()
+            return
+
+        with self._waiter() as wait:
+            for index in range(0, count):
+                self._stream.write(".")
+                self._stream.flush()
+                if wait(interval):
+                    self._stream.write("." * (count - index - 1))
+                    break
+
+        self._stream.flush()
+
+
+_DEFAULT_TYPEWRITER = None
+
+
+def default_typewriter():
+    """Get the typewriter for standard output.
+
+    Text is not animated if the NONINTERACTIVE environment variable
+    is set.
+    """
+    global _DEFAULT_TYPEWRITER  # pylint: disable=global-statement
+
+    if _DEFAULT_TYPEWRITER is None:
+        _DEFAULT_TYPEWRITER = Typewriter(
+            animate=not os.environ.get("NONINTERACTIVE", None)
+        )
+
+    return _DEFAULT_TYPEWRITER
+
+
+def set_default_typewriter(typewriter):
+    """Replace the typewriter used for standard output."""
+    global _DEFAULT_TYPEWRITER  # pylint: disable=global-statement
+
+    _DEFAULT_TYPEWRITER = typewriter
+
+
+@contextlib.contextmanager
+def using_typewriter(typewriter):
+    """Use typewriter as the default typewriter inside a with block.
+
+    If typewriter is None, the default typewriter is left alone.
+    """
+    if typewriter is None:
+        yield
+        return
+
+    previous = _DEFAULT_TYPEWRITER
+    set_default_typewriter(typewriter)
+    try:
+        yield
+    finally:
+        set_default_typewriter(previous)